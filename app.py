@@ -1,13 +1,25 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
 from datetime import datetime
-from google.cloud import firestore
-from google.oauth2 import service_account
 import hashlib
+import functools
+import os
+import random
 import re
+import time
+from catalog_stats import ATOS_BIN, StatsEngine
+from catalog_store import MultiCatalogStore, parse_sources
+from covers import CoverCache, cover_source_from_spec
+from datastore import MemoryRepository, RepositoryLoader
+from export import FORMATS as EXPORT_FORMATS, ExportCache, available_formats
+from filters import ALL, FilterCriteria, FilterEngine
+from leaderboard import LikeBoard
+from perf import PerfStats
+from similar import SimilarBooks
 
 # ==========================================
-# 1. 样式与配置 (完全原样)
+# 1. 样式与配置
 # ==========================================
 st.set_page_config(page_title="智慧书库·全能旗舰版", layout="wide", page_icon="📚")
 
@@ -21,10 +33,13 @@ st.markdown("""
         background: white; padding: 20px; border-radius: 12px; border: 1px solid #e2d1b0;
         box-shadow: 0 4px 6px rgba(0,0,0,0.05); min-height: 330px; display: flex; flex-direction: column;
     }
+    .tile-cover { height: 180px; margin-bottom: 10px; border-radius: 8px; background: #f3ead7; display: flex; align-items: center; justify-content: center; overflow: hidden; }
+    .tile-cover img { max-width: 100%; max-height: 100%; }
+    .cover-placeholder { color: #c9b48a; font-size: 2.5em; }
     .tile-title { color: #1e3d59; font-size: 1.1em; font-weight: bold; margin-bottom: 5px; height: 2.8em; overflow: hidden; }
     .tag-container { margin-top: auto; display: flex; flex-wrap: wrap; gap: 5px; margin-bottom: 15px; }
     .tag { padding: 3px 8px; border-radius: 4px; font-size: 0.75em; font-weight: bold; color: white; }
-    .tag-ar { background: #ff6e40; } .tag-word { background: #1e3d59; } .tag-fnf { background: #2a9d8f; } .tag-quiz { background: #6d597a; }
+    .tag-ar { background: #ff6e40; } .tag-word { background: #1e3d59; } .tag-fnf { background: #2a9d8f; } .tag-quiz { background: #6d597a; } .tag-cmt { background: #e9c46a; color: #1e3d59; }
 
     .comment-box { background: white; padding: 15px; border-radius: 10px; margin-bottom: 12px; border: 1px solid #eee; border-left: 5px solid #1e3d59; }
     .comment-meta { color: #888; font-size: 0.8em; margin-bottom: 5px; display: flex; justify-content: space-between;}
@@ -43,23 +58,64 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ==========================================
-# 2. 数据库与安全工具 (完全原样)
+# 2. 数据库与安全工具
 # ==========================================
 
 @st.cache_resource
-def get_db_client():
-    """连接 Firestore 数据库"""
+def get_perf_stats():
+    """各阶段耗时的进程内聚合 (见 perf.py)；设置 PERF_LOG 时每次重跑追加一行 JSON 日志"""
+    return PerfStats(log_path=os.environ.get("PERF_LOG") or None)
+
+# 本次重跑的分阶段计时，在脚本末尾汇总
+trace = get_perf_stats().start()
+
+def traced_fragment(fn):
+    """写在 @st.fragment 之下。片段单独重跑时整页的 trace 已经结束，另开一次计时，
+    片段内的 trace.span (如读取留言) 照常汇入 PerfStats 与 PERF_LOG；随整页执行时计入整页的 trace"""
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        global trace
+        if not trace.finished: return fn(*args, **kwargs)
+        trace = get_perf_stats().start()
+        try: return fn(*args, **kwargs)
+        finally: trace.finish(total=f"fragment:{fn.__name__}", view="fragment", fragment=fn.__name__)
+    return run
+
+def create_repository():
+    """数据访问层 (见 datastore.py)；DATA_BACKEND=memory 时使用进程内存储，可完全离线运行"""
+    if os.environ.get("DATA_BACKEND", "firestore") == "memory":
+        return MemoryRepository()
+    # Google 相关的库导入较慢，只在连接 Firestore 时才导入
+    from google.cloud import firestore
+    from google.oauth2 import service_account
+    from datastore_firestore import FirestoreRepository
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        # 连接本地 Firestore 模拟器，无需凭据
+        return FirestoreRepository(firestore.Client(project=os.environ.get("GCLOUD_PROJECT", "library-app")))
+    # 必须在 .streamlit/secrets.toml 中配置 firestore 信息
+    key_dict = st.secrets["firestore"]
+    creds = service_account.Credentials.from_service_account_info(key_dict)
+    return FirestoreRepository(firestore.Client(credentials=creds, project=key_dict["project_id"]))
+
+@st.cache_resource
+def get_repository_loader():
+    """所有会话共享一个数据访问层，在后台线程中创建 (页面渲染完后才开始，见脚本末尾)"""
+    return RepositoryLoader(create_repository)
+
+def get_repo(wait=True):
+    """登录、留言、管理等操作使用：必要时等待创建完成。
+    wait=False 时不等待，尚未创建好返回 None (图书墙的留言数、榜单用，不阻塞渲染)；连接失败时返回 None"""
     try:
-        # 必须在 .streamlit/secrets.toml 中配置 firestore 信息
-        key_dict = st.secrets["firestore"]
-        creds = service_account.Credentials.from_service_account_info(key_dict)
-        return firestore.Client(credentials=creds, project=key_dict["project_id"])
+        return get_repository_loader().get(wait)
     except Exception as e:
         # 本地测试时若无 secrets 可通过 try-except 避免直接报错，但在云端必须配置
-        st.error(f"数据库连接提示: {e}")
+        if wait: st.error(f"数据库连接提示: {e}")
         return None
 
-db = get_db_client()
+def get_secret(key, default=""):
+    """读取 secrets；没有 secrets.toml (如离线运行) 时返回默认值"""
+    try: return st.secrets.get(key, default)
+    except Exception: return default
 
 def make_hash(password):
     """简单的密码哈希"""
@@ -80,32 +136,33 @@ def validate_email(email):
 
 def get_user_role(email):
     """获取用户角色"""
-    if db is None: return "guest"
+    repo = get_repo()
+    if repo is None: return "guest"
     # Owner 邮箱在 secrets 中配置
-    if email == st.secrets.get("owner_email", ""):
+    if email == get_secret("owner_email"):
         return "owner"
     
-    doc = db.collection("users").document(email).get()
-    if doc.exists:
-        return doc.to_dict().get("role", "user")
+    with trace.span("get_user_role"):
+        user = repo.get_user(email)
+    if user is not None:
+        return user.get("role", "user")
     return "guest"
 
 def register_user(email, password, nickname):
-    if db is None: return False
+    repo = get_repo()
+    if repo is None: return False
     try:
-        doc_ref = db.collection("users").document(email)
-        if doc_ref.get().exists:
+        if repo.get_user(email) is not None:
             st.warning("该邮箱已被注册")
             return False
         
-        role = "owner" if email == st.secrets.get("owner_email", "") else "user"
+        role = "owner" if email == get_secret("owner_email") else "user"
         
-        doc_ref.set({
+        repo.create_user(email, {
             "email": email,
             "password": make_hash(password),
             "nickname": nickname,
             "role": role,
-            "created_at": firestore.SERVER_TIMESTAMP
         })
         st.success("注册成功！请登录。")
         return True
@@ -114,11 +171,11 @@ def register_user(email, password, nickname):
         return False
 
 def login_user(email, password):
-    if db is None: return None
+    repo = get_repo()
+    if repo is None: return None
     try:
-        doc = db.collection("users").document(email).get()
-        if doc.exists:
-            user_data = doc.to_dict()
+        user_data = repo.get_user(email)
+        if user_data is not None:
             # 【修复点 1】：防止数据库中 password 字段缺失引发崩溃
             if check_hashes(password, user_data.get('password', '')):
                 return user_data
@@ -130,60 +187,107 @@ def login_user(email, password):
         st.error(f"登录错误: {e}")
     return None
 
+def load_user_likes(email):
+    """登录用户已点赞的书名集合"""
+    repo = get_repo()
+    if repo is None: return set()
+    try:
+        return repo.user_likes(email)
+    except Exception:
+        return set()
+
 # ==========================================
-# 4. 数据加载 (Google Sheets - 完全原样)
+# 4. 数据加载 (多个表格来源 + 本地快照)
 # ==========================================
 CSV_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vTTIN0pxN-TYH1-_Exm6dfsUdo7SbnqVnWvdP_kqe63PkSL8ni7bH6r6c86MLUtf_q58r0gI2Ft2460/pub?output=csv"
 
-@st.cache_data(ttl=600)
+# 可用环境变量指向其它表格或本地 CSV 文件 (测试用)
+CATALOG_URL = os.environ.get("CATALOG_URL", CSV_URL)
+SNAPSHOT_DIR = os.environ.get("CATALOG_SNAPSHOT_DIR", ".catalog_cache")
+
+# 多个来源 (如各校区、各学段的表格)：环境变量 CATALOG_SOURCES 或 secrets 中的 catalog_sources，
+# 格式为逗号/换行分隔的「名称=地址」；未配置时只用 CATALOG_URL 一个来源
+_sources = os.environ.get("CATALOG_SOURCES") or get_secret("catalog_sources") or CATALOG_URL
+CATALOG_SOURCES = parse_sources(",".join(_sources) if isinstance(_sources, (list, tuple)) else _sources)
+
+@st.cache_resource
+def get_catalog_store(sources):
+    """整个进程共享一份合并后的目录；各来源并发拉取，10 分钟后在后台各自与表格重新同步"""
+    return MultiCatalogStore(list(sources), SNAPSHOT_DIR, ttl=600)
+
 def load_data():
+    # 列位置、类型转换与表格结构漂移检测见 catalog.CATALOG_SCHEMA，多来源的合并去重见 catalog.merge_catalogs
+    store = get_catalog_store(tuple(CATALOG_SOURCES))
     try:
-        df = pd.read_csv(CSV_URL)
-        # =========================================================
-        # 修正列索引映射 (基于0开始计数：A=0, B=1... K=10, M=12)
-        # =========================================================
-        c = {
-            "il": 1,        # B列: Interest Level
-            "rec": 2,       # C列: 推荐人
-            "title": 3,     # D列: 书名
-            "author": 4,    # E列: 作者
-            "ar": 5,        # F列: ATOS
-            "quiz": 7,      # H列: Quiz No
-            "word": 8,      # I列: Word Count
-            "en": 10,       # K列: 英文推荐理由 (Index 10)
-            "cn": 12,       # M列: 中文推荐理由 (Index 12)
-            "fnf": 14,      # O列: Fiction/Nonfiction
-            "topic": 15,    # P列: Topic
-            "series": 16    # Q列: Series
-        }
-        
-        # 数据清洗与类型转换
-        # 提取 AR 数字
-        df.iloc[:, c['ar']] = pd.to_numeric(
-            df.iloc[:, c['ar']].astype(str).str.extract(r'(\d+\.?\d*)')[0], 
-            errors='coerce'
-        ).fillna(0.0)
-        
-        # 转换词数为整数
-        df.iloc[:, c['word']] = pd.to_numeric(
-            df.iloc[:, c['word']], 
-            errors='coerce'
-        ).fillna(0).astype(int)
-        
-        return df.fillna(" "), c
+        df, ver = store.get()
     except Exception as e:
         st.error(f"数据加载失败: {e}")
-        return pd.DataFrame(), {}
+        return pd.DataFrame(), ""
+    for name, src in zip(store.names, store.stores):
+        if name not in store.errors: continue
+        label = f"「{name}」" if len(store.names) > 1 else ""
+        if src.df is None:
+            st.sidebar.warning(f"⚠️ 书目来源{label}暂不可用 (加载中或拉取失败)，先显示其它来源的图书")
+        else:
+            when = datetime.fromtimestamp(src.updated_at).strftime("%Y-%m-%d %H:%M") if src.updated_at else "本地快照"
+            st.sidebar.warning(f"⚠️ 书目{label}更新失败，暂时显示 {when} 的数据")
+    return df, ver
+
+@st.cache_resource(max_entries=2)
+def get_filter_engine(ver, _df):
+    """每个目录版本只构建一次筛选引擎，所有会话共享；模糊检索索引随即在后台构建"""
+    engine = FilterEngine(_df)
+    engine.start_index()
+    return engine
+
+@st.cache_resource(max_entries=2)
+def get_stats_engine(ver, _df):
+    """统计页的预处理 (ATOS 分箱、分类编号)，结果按筛选条件缓存"""
+    return StatsEngine(_df)
+
+@st.cache_resource(max_entries=2)
+def get_similar_books(ver, _df):
+    """相似图书的特征矩阵，每个目录版本只构建一次"""
+    return SimilarBooks(_df)
 
-df, idx = load_data()
+@st.cache_resource
+def get_export_cache():
+    """导出文件缓存 (临时目录)，所有会话共享"""
+    return ExportCache()
+
+@st.cache_resource(max_entries=2)
+def get_book_index(ver, _df):
+    """图书 ID -> 行号，每个目录版本只建一次"""
+    return dict(zip(_df['id'].tolist(), range(len(_df)))) if 'id' in _df else {}
+
+# 封面：环境变量 COVER_SOURCE 或 secrets 中的 cover_source，为本地目录或 URL 模板 (见 covers.py)；未配置时不显示封面
+COVER_SOURCE = os.environ.get("COVER_SOURCE") or get_secret("cover_source")
+# 缩略图缓存在 static/ 下，由 Streamlit 的静态文件服务 (.streamlit/config.toml 中开启) 按 URL 提供
+COVER_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "covers")
+COVER_URL = "app/static/covers/"
+COVER_CACHE_MB = int(os.environ.get("COVER_CACHE_MB", "200"))
+
+@st.cache_resource
+def get_cover_cache():
+    """封面缩略图缓存 (磁盘 + 内存)，所有会话共享；未配置封面来源时为 None"""
+    source = cover_source_from_spec(COVER_SOURCE)
+    return CoverCache(source, COVER_CACHE_DIR, max_bytes=COVER_CACHE_MB * 2**20) if source else None
+
+with trace.span("load_data"):
+    df, ver = load_data()
+    book_index = get_book_index(ver, df)
 
 # ==========================================
-# 5. 初始化 Session State (完全原样)
+# 5. 初始化 Session State
 # ==========================================
 state_keys = {
     'bk_focus': None, 'lang_mode': 'CN', 'voted': set(), 
-    'edit_id': None, 'edit_doc_id': None, 'blind_idx': None, 
+    'edit_id': None, 'edit_doc_id': None, 'blind_id': None, 
     'temp_comment': "", 'form_version': 0,
+    # 图书墙分页
+    'wall_page': 0, 'wall_sig': None,
+    # 留言已展开的页数 {图书 ID: 页数}
+    'comment_pages': {},
     # 用户登录状态
     'logged_in': False, 'user_email': None, 'user_nickname': "游客", 'user_role': 'guest'
 }
@@ -192,6 +296,29 @@ for key, val in state_keys.items():
     if key not in st.session_state:
         st.session_state[key] = val
 
+# 图书一律用图书 ID (catalog.book_ids) 标识：bk_focus、点赞、留言都按 ID 记录。
+# 详情页的 ID 同步到地址栏 ?book=<图书 ID>，链接可直接打开某本书的详情页
+def open_book(book_id):
+    st.session_state.bk_focus = book_id
+    st.query_params["book"] = book_id
+
+def close_book():
+    st.session_state.bk_focus = None
+    st.query_params.pop("book", None)
+
+def rerun_fragment():
+    """片段 (st.fragment) 内的操作只重跑该片段；整页重跑时 (如 AppTest) 不允许，退回为整页重跑"""
+    try: st.rerun(scope="fragment")
+    except StreamlitAPIException: st.rerun()
+
+def book_title(book_id):
+    """图书 ID 对应的书名；已不在书目中的返回 ID 本身"""
+    i = book_index.get(book_id)
+    return df['title'].iat[i] if i is not None else book_id
+
+if st.query_params.get("book"):
+    st.session_state.bk_focus = st.query_params["book"]
+
 # ==========================================
 # 6. 侧边栏：登录/注册/管理
 # ==========================================
@@ -215,6 +342,7 @@ with st.sidebar:
                     st.session_state.user_email = user_info.get('email', l_email)
                     st.session_state.user_nickname = user_info.get('nickname', 'User')
                     st.session_state.user_role = get_user_role(st.session_state.user_email) 
+                    st.session_state.voted = load_user_likes(st.session_state.user_email)
                     st.rerun()
 
         with auth_mode[1]: # 注册
@@ -239,13 +367,13 @@ with st.sidebar:
                     try:
                         # 验证 Project ID 是否匹配
                         if pid_key == st.secrets["firestore"]["project_id"]:
-                            db.collection("users").document(target_m).update({"password": make_hash(new_p)})
+                            get_repo().update_user(target_m, {"password": make_hash(new_p)})
                             st.success("✅ 重置成功！请登录。")
                         else: st.error("❌ 验证密钥错误")
                     except: st.error("重置失败，邮箱未注册")
 
     else:
-        # 已登录状态显示 (保持原样)
+        # 已登录状态显示
         role_badges = {"owner": "👑 Owner", "admin": "🛡️ Admin", "user": "👤 User"}
         role_cls = f"badge-{st.session_state.user_role}"
         st.markdown(f"""
@@ -258,84 +386,228 @@ with st.sidebar:
             st.session_state.user_email = None
             st.session_state.user_nickname = "游客"
             st.session_state.user_role = "guest"
+            st.session_state.voted = set()
             st.rerun()
 
-        # --- Owner 专属管理面板 (保持原样) ---
+        # --- Owner 专属管理面板 ---
         if st.session_state.user_role == 'owner':
             with st.expander("⚙️ 权限管理 (Owner Only)"):
                 manage_email = st.text_input("输入用户邮箱")
                 new_role = st.selectbox("设置角色", ["user", "admin"])
                 if st.button("更新权限"):
-                    if db:
+                    repo = get_repo()
+                    if repo:
                         try:
-                            db.collection("users").document(manage_email).update({"role": new_role})
+                            repo.update_user(manage_email, {"role": new_role})
                             st.success(f"已将 {manage_email} 设为 {new_role}")
                         except Exception as e:
                             st.error(f"更新失败: {e}")
 
+            with st.expander("📈 性能监控 (Owner Only)"):
+                perf = get_perf_stats()
+                st.caption(f"最近 {perf.window} 次重跑内各阶段耗时 (已记录 {perf.runs} 次完整重跑)")
+                phases = perf.summary()
+                if phases: st.dataframe(pd.DataFrame(phases), hide_index=True, use_container_width=True)
+                else: st.info("暂无计时数据")
+                repo = get_repo(wait=False)
+                if repo is not None:
+                    st.caption("数据库调用 (进程启动以来，读写按文档计)")
+                    ops = pd.DataFrame.from_dict(repo.stats.snapshot(), orient="index")
+                    if not ops.empty:
+                        ops.loc["合计"] = repo.stats.totals()
+                        ops["avg_ms"] = (ops["ms"] / ops["calls"]).round(2)
+                        st.dataframe(ops.drop(columns="ms"), use_container_width=True)
+                if not df.empty:
+                    mb = df.memory_usage(deep=True).sum() / 2**20
+                    st.caption(f"书目：{len(df):,} 行 · 内存 {mb:.1f} MB · 版本 {ver[:8]}")
+                if st.button("清空统计"):
+                    perf.reset()
+                    if repo is not None: repo.stats.reset()
+                    st.rerun()
+
     st.write("---")
     st.markdown('<div class="sidebar-title">🔍 检索中心</div>', unsafe_allow_html=True)
 
 # ==========================================
-# 7. 评论功能逻辑 (保持原样)
+# 7. 评论功能逻辑
 # ==========================================
 
-def load_db_comments(book_title):
-    if db is None: return []
+COMMENT_PAGE_SIZE = 20   # 每次「加载更多」读取的留言条数
+COMMENT_CACHE_TTL = 120  # 秒；期间同一本书的留言只读一次数据库
+
+@st.cache_resource
+def get_comment_cache():
+    """按书缓存已读取的留言分页，所有会话共享: {图书 ID: {"t": 时间, "pages": [...]}}"""
+    return {}
+
+def _fetch_comment_page(repo, book_id, cursor):
+    """按时间倒序取一页"""
+    items, cursor, more = repo.comment_page(book_id, COMMENT_PAGE_SIZE, cursor)
+    return {"items": items, "cursor": cursor, "more": more}
+
+def load_db_comments(book_id, pages=1):
+    """返回 (前 pages 页留言, 是否还有更多)"""
+    repo = get_repo()
+    if repo is None: return [], False
+    cache = get_comment_cache()
+    entry = cache.get(book_id)
+    if entry is None or time.time() - entry["t"] > COMMENT_CACHE_TTL:
+        entry = {"t": time.time(), "pages": []}
+    # 在副本上追加新页再整体替换，多个会话同时读取也不会互相打乱
+    got = list(entry["pages"])
     try:
-        col_ref = db.collection("comments").where("book", "==", book_title)
-        docs = col_ref.stream()
-        comments = [{"id": d.id, **d.to_dict()} for d in docs]
-        # 按时间排序
-        return sorted(comments, key=lambda x: x.get('timestamp', str(datetime.now())), reverse=True)
-    except: return []
-
-def save_db_comment(book_title, text, comment_id=None):
-    if db is None: return
+        with trace.span("load_db_comments"):
+            while len(got) < pages and (not got or got[-1]["more"]):
+                got.append(_fetch_comment_page(repo, book_id, got[-1]["cursor"] if got else None))
+    except: return [], False
+    if len(got) > len(entry["pages"]):
+        cache[book_id] = {"t": entry["t"], "pages": got}
+    shown = got[:pages]
+    return [m for p in shown for m in p["items"]], bool(shown) and shown[-1]["more"]
+
+def invalidate_comments(book_id):
+    """写入后丢弃该书的留言缓存，下次读取时重新查询"""
+    get_comment_cache().pop(book_id, None)
+
+def save_db_comment(book_id, book_title, text, comment_id=None):
+    repo = get_repo()
+    if repo is None: return
     data = {
+        "book_id": book_id,
         "book": book_title,
         "text": text,
         "author_email": st.session_state.user_email,
         "author_nick": st.session_state.user_nickname,
         "time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        "timestamp": firestore.SERVER_TIMESTAMP
     }
     try:
         if comment_id:
-            db.collection("comments").document(comment_id).update({"text": text, "time": data["time"]})
+            repo.update_comment(comment_id, {"text": text, "time": data["time"]})
         else:
-            db.collection("comments").add(data)
+            repo.add_comment(data)
+            invalidate_comment_count(book_id)
+        invalidate_comments(book_id)
         st.toast("✅ 留言已发布", icon='☁️')
     except Exception as e:
         st.error(f"保存失败: {e}")
 
-def delete_comment(comment_id):
-    if db:
+def delete_comment(comment_id, book_id):
+    repo = get_repo()
+    if repo:
         try:
-            db.collection("comments").document(comment_id).delete()
+            repo.delete_comment(comment_id, book_id)
+            invalidate_comments(book_id)
+            invalidate_comment_count(book_id)
             st.toast("🗑️ 留言已删除")
         except Exception as e:
             st.error(f"删除失败: {e}")
 
+# ---------- 每本书的留言计数 (图书墙展示用) ----------
+COMMENT_COUNT_TTL = 300  # 秒
+
+@st.cache_resource
+def get_comment_count_cache():
+    """所有会话共享的留言数缓存: {图书 ID: (数量, 读取时间)}"""
+    return {}
+
+def load_comment_counts(book_ids):
+    """一次批量读取当前页各书的留言数，已缓存且未过期的不再读库；数据库尚未连上时返回 None"""
+    if not get_repository_loader().ready(): return None
+    repo = get_repo(wait=False)
+    if repo is None: return {}
+    cache, now = get_comment_count_cache(), time.time()
+    missing = [t for t in dict.fromkeys(book_ids) if t not in cache or now - cache[t][1] > COMMENT_COUNT_TTL]
+    if missing:
+        try:
+            with trace.span("comment_counts"):
+                counts = repo.comment_counts(missing)
+            for t, n in counts.items():
+                cache[t] = (n, now)
+        except Exception:
+            pass
+    return {t: cache[t][0] for t in book_ids if t in cache}
+
+def invalidate_comment_count(book_id):
+    get_comment_count_cache().pop(book_id, None)
+
+# ==========================================
+# 7.4 点赞与全站榜单
+# ==========================================
+# 点赞数按分片存储 (见 datastore.LIKE_SHARDS)，热门书的并发点赞不会触及单文档写入上限。
+LIKE_BOARD_SIZE = 20
+LIKE_BOARD_TTL = 600  # 秒；过期后在后台读回有变化的图书，本进程的点赞随时按增量更新榜单
+
+def toggle_like(book_id):
+    """切换点赞：登录用户写入数据库并计入全站榜单，游客只保存在本次会话"""
+    like = book_id not in st.session_state.voted
+    if like: st.session_state.voted.add(book_id)
+    else: st.session_state.voted.discard(book_id)
+    if not st.session_state.logged_in: return
+    repo = get_repo()
+    if repo is None: return
+    try:
+        delta = repo.set_like(st.session_state.user_email, book_id, like)
+        if delta: get_like_board().add(book_id, delta)
+    except Exception as e:
+        st.error(f"点赞失败: {e}")
+
+@st.cache_resource
+def get_like_board():
+    """所有会话共享的榜单"""
+    return LikeBoard(LIKE_BOARD_SIZE)
+
+def load_like_board():
+    """返回 [(图书 ID, 点赞数)]，按点赞数降序；数据库尚未连上或榜单仍在后台载入时返回 None"""
+    repo = get_repo(wait=False)
+    if repo is None: return None
+    board = get_like_board()
+    with trace.span("like_board"):
+        board.ensure_loaded(repo.like_totals, LIKE_BOARD_TTL)
+    return list(board.top) if board.loaded_at else None
+
 # ==========================================
-# 8. 图书详情页 (主逻辑 - 保持原样)
+# 7.5 图书墙分页
+# ==========================================
+WALL_PAGE_SIZES = [12, 24, 48, 96]
+WALL_PAGE_SIZE = 24  # 默认每页本数
+
+def render_pager(page, n_pages, total, pos):
+    """翻页条：上一页 / 页码 / 下一页，页码保存在 session_state.wall_page"""
+    p1, p2, p3 = st.columns([1, 2, 1])
+    if p1.button("◀ 上一页", key=f"pg_prev_{pos}", disabled=page == 0, use_container_width=True):
+        st.session_state.wall_page = page - 1; st.rerun()
+    p2.markdown(f"<div style='text-align:center; padding-top:6px; color:#666;'>第 {page + 1} / {n_pages} 页 · 共 {total:,} 本</div>", unsafe_allow_html=True)
+    if p3.button("下一页 ▶", key=f"pg_next_{pos}", disabled=page >= n_pages - 1, use_container_width=True):
+        st.session_state.wall_page = page + 1; st.rerun()
+
 # ==========================================
+# 8. 图书详情页
+# ==========================================
+SIMILAR_COUNT = 6  # 详情页展示的相似图书本数
+
+if st.session_state.bk_focus is not None and st.session_state.bk_focus not in book_index:
+    # 链接中的书已不在书目中 (或 ID 有误)，回到图书墙
+    st.warning(f"未找到图书 {st.session_state.bk_focus}，可能已从书目中移除")
+    close_book()
+
 if st.session_state.bk_focus is not None:
-    row = df.iloc[st.session_state.bk_focus]
-    title_key = str(row.iloc[idx['title']])
+    book_id = st.session_state.bk_focus
+    row = df.iloc[book_index[book_id]]
+    title_key = str(row['title'])
     
     if st.button("⬅️ 返回图书墙"): 
-        st.session_state.bk_focus = None
+        close_book()
         st.rerun()
     
     st.markdown(f"# 📖 {title_key}")
+    if len(CATALOG_SOURCES) > 1: st.caption(f"🏫 来源：{row['source']}")
     
     # 详情卡片
     c1, c2, c3 = st.columns(3)
     infos = [
-        ("👤 作者", row.iloc[idx['author']]), ("📚 类型", row.iloc[idx['fnf']]), ("🎯 Interest Level", row.iloc[idx['il']]), 
-        ("📊 ATOS Book Level", row.iloc[idx['ar']]), ("🔢 Quiz No.", row.iloc[idx['quiz']]), ("📝 词数", f"{row.iloc[idx['word']]:,}"), 
-        ("🔗 系列", row.iloc[idx['series']]), ("🏷️ 主题", row.iloc[idx['topic']]), ("🙋 推荐人", row.iloc[idx['rec']])
+        ("👤 作者", row['author']), ("📚 类型", row['fnf']), ("🎯 Interest Level", row['il']), 
+        ("📊 ATOS Book Level", f"{row['ar']:.1f}"), ("🔢 Quiz No.", row['quiz'] or " "), ("📝 词数", f"{row['word']:,}"), 
+        ("🔗 系列", row['series']), ("🏷️ 主题", row['topic']), ("🙋 推荐人", row['rec'])
     ]
     for i, (l, v) in enumerate(infos):
         with [c1, c2, c3][i % 3]: st.markdown(f'<div class="info-card"><small>{l}</small><br><b>{v}</b></div>', unsafe_allow_html=True)
@@ -346,167 +618,302 @@ if st.session_state.bk_focus is not None:
     if lb2.button("US English", use_container_width=True): st.session_state.lang_mode = "EN"; st.rerun()
     
     # 根据 lang_mode 显示对应列内容
-    content = row.iloc[idx["cn"]] if st.session_state.lang_mode=="CN" else row.iloc[idx["en"]]
+    content = row["cn"] if st.session_state.lang_mode=="CN" else row["en"]
     st.markdown(f'<div style="background:#fffcf5; padding:25px; border-radius:15px; border:2px dashed #ff6e40;">{content}</div>', unsafe_allow_html=True)
 
+    # 相似图书：按 ATOS、词数、Interest Level、类型、主题、系列找最相近的几本
+    st.write("#### 🧭 相似图书")
+    wall_criteria = st.session_state.wall_sig[0] if st.session_state.wall_sig else None
+    within = None
+    if wall_criteria is not None and wall_criteria != FilterCriteria():
+        if st.toggle("只在当前筛选结果中查找", key="sim_within"):
+            within = get_filter_engine(ver, df).select(wall_criteria)
+    with trace.span("similar"):
+        sim_rows = get_similar_books(ver, df).query(book_index[book_id], SIMILAR_COUNT, within)
+    if len(sim_rows):
+        sim_cols = st.columns(SIMILAR_COUNT // 2)
+        sim = df.iloc[sim_rows]
+        for i, (s_id, s_title, s_author, s_ar) in enumerate(zip(sim['id'].tolist(), sim['title'].tolist(), sim['author'].tolist(), sim['ar'].tolist())):
+            with sim_cols[i % len(sim_cols)]:
+                st.markdown(f'<div class="info-card"><small>{s_author} · ATOS {s_ar:.1f}</small><br><b>《{s_title}》</b></div>', unsafe_allow_html=True)
+                if st.button("查看详情", key=f"sim_{s_id}", use_container_width=True):
+                    open_book(s_id); st.rerun()
+    else: st.caption("当前筛选结果中没有其它图书")
+
     st.markdown("---")
     st.subheader("💬 留言互动区")
+
+    @st.fragment
+    @traced_fragment
+    def comment_section(book_id, title_key):
+        """留言列表与发表表单：翻页、发布、修改、删除只重跑这一段，不重跑整页"""
+        # 加载留言 (按页读取，「加载更多」追加下一页)
+        n_pages = st.session_state.comment_pages.get(book_id, 1)
+        cloud_comments, more_comments = load_db_comments(book_id, n_pages)
     
-    # 加载留言
-    cloud_comments = load_db_comments(title_key)
-    
-    # 显示留言列表
-    for i, m in enumerate(cloud_comments):
-        is_mine = m.get('author_email') == st.session_state.user_email
-        is_admin = st.session_state.user_role in ['admin', 'owner']
+        # 显示留言列表
+        for i, m in enumerate(cloud_comments):
+            is_mine = m.get('author_email') == st.session_state.user_email
+            is_admin = st.session_state.user_role in ['admin', 'owner']
         
-        st.markdown(f"""
-        <div class="comment-box">
-            <div class="comment-meta">
-                <span>👤 {m.get('author_nick', '匿名用户')}</span>
-                <span>📅 {m.get('time')}</span>
+            st.markdown(f"""
+            <div class="comment-box">
+                <div class="comment-meta">
+                    <span>👤 {m.get('author_nick', '匿名用户')}</span>
+                    <span>📅 {m.get('time')}</span>
+                </div>
+                {m.get('text')}
             </div>
-            {m.get('text')}
-        </div>
-        """, unsafe_allow_html=True)
+            """, unsafe_allow_html=True)
         
-        col_ops = st.columns([1, 1, 8])
+            col_ops = st.columns([1, 1, 8])
         
-        # 按钮：修改 (仅本人)
-        if st.session_state.logged_in and is_mine and st.session_state.edit_id is None:
-            if col_ops[0].button("✏️", key=f"edit_{i}", help="修改留言"):
-                st.session_state.edit_id = i
-                st.session_state.edit_doc_id = m["id"]
-                st.session_state.temp_comment = m["text"]
-                st.session_state.form_version += 1
-                st.rerun()
+            # 按钮：修改 (仅本人)
+            if st.session_state.logged_in and is_mine and st.session_state.edit_id is None:
+                if col_ops[0].button("✏️", key=f"edit_{i}", help="修改留言"):
+                    st.session_state.edit_id = i
+                    st.session_state.edit_doc_id = m["id"]
+                    st.session_state.temp_comment = m["text"]
+                    st.session_state.form_version += 1
+                    rerun_fragment()
         
-        # 按钮：删除 (本人或管理员)
-        if st.session_state.logged_in and (is_mine or is_admin) and st.session_state.edit_id is None:
-             if col_ops[1].button("🗑️", key=f"del_{i}", help="删除留言"):
-                 delete_comment(m["id"])
-                 st.rerun()
-
-    # 留言输入框 (仅限注册/登录用户显示)
-    if st.session_state.logged_in:
-        is_editing = st.session_state.edit_id is not None
-        input_key = f"input_area_v{st.session_state.form_version}"
+            # 按钮：删除 (本人或管理员)
+            if st.session_state.logged_in and (is_mine or is_admin) and st.session_state.edit_id is None:
+                 if col_ops[1].button("🗑️", key=f"del_{i}", help="删除留言"):
+                     delete_comment(m["id"], book_id)
+                     rerun_fragment()
+
+        if more_comments and st.button("⬇️ 加载更多留言", key="more_comments"):
+            st.session_state.comment_pages[book_id] = n_pages + 1
+            rerun_fragment()
+
+        # 留言输入框 (仅限注册/登录用户显示)
+        if st.session_state.logged_in:
+            is_editing = st.session_state.edit_id is not None
+            input_key = f"input_area_v{st.session_state.form_version}"
         
-        with st.form("comment_form", clear_on_submit=False):
-            st.write("✍️ " + ("修改留言" if is_editing else f"发表留言 (作为 {st.session_state.user_nickname})"))
-            user_input = st.text_area("内容", value=st.session_state.temp_comment, key=input_key)
+            with st.form("comment_form", clear_on_submit=False):
+                st.write("✍️ " + ("修改留言" if is_editing else f"发表留言 (作为 {st.session_state.user_nickname})"))
+                user_input = st.text_area("内容", value=st.session_state.temp_comment, key=input_key)
             
-            cb1, cb2, _ = st.columns([1, 1, 4])
-            if cb1.form_submit_button("发布" if not is_editing else "保存"):
-                if user_input.strip():
-                    save_db_comment(title_key, user_input, st.session_state.get('edit_doc_id'))
-                    st.session_state.edit_id = None
-                    st.session_state.edit_doc_id = None
-                    st.session_state.temp_comment = ""
-                    st.session_state.form_version += 1
-                    st.rerun()
-                else: st.warning("内容不能为空")
+                cb1, cb2, _ = st.columns([1, 1, 4])
+                if cb1.form_submit_button("发布" if not is_editing else "保存"):
+                    if user_input.strip():
+                        save_db_comment(book_id, title_key, user_input, st.session_state.get('edit_doc_id'))
+                        st.session_state.edit_id = None
+                        st.session_state.edit_doc_id = None
+                        st.session_state.temp_comment = ""
+                        st.session_state.form_version += 1
+                        rerun_fragment()
+                    else: st.warning("内容不能为空")
             
-            if is_editing and cb2.form_submit_button("❌ 取消"):
-                st.session_state.edit_id = None; st.session_state.edit_doc_id = None
-                st.session_state.temp_comment = ""; st.session_state.form_version += 1
-                st.rerun()
-    else:
-        # 游客提示
-        st.info("🔒 游客模式仅供浏览。想发表感悟或参与互动？请在左侧注册或登录。")
+                if is_editing and cb2.form_submit_button("❌ 取消"):
+                    st.session_state.edit_id = None; st.session_state.edit_doc_id = None
+                    st.session_state.temp_comment = ""; st.session_state.form_version += 1
+                    rerun_fragment()
+        else:
+            # 游客提示
+            st.info("🔒 游客模式仅供浏览。想发表感悟或参与互动？请在左侧注册或登录。")
+
+    comment_section(book_id, title_key)
 
 # ==========================================
-# 9. 主视图 (筛选与图书墙 - 保持原样)
+# 9. 主视图 (筛选与图书墙)
 # ==========================================
 elif not df.empty:
+    engine = get_filter_engine(ver, df)
+    # 筛选控件的 key 为 f_<条件名>。下拉框选项旁的数量取决于其余条件，
+    # 因此先从 session_state 读出本次的控件值 (首次为默认值)，算好计数再绘制控件
+    criteria = FilterCriteria(**{k: st.session_state.get(f"f_{k}", v) for k, v in FilterCriteria._field_defaults.items()})
+    with trace.span("filter"):
+        facet_counts = engine.facet_counts(criteria)
+
+    def facet_select(label, facet):
+        """分类列下拉框，选项显示为「取值 (改选后的本数)」"""
+        counts = facet_counts[facet]
+        opts = [ALL] + [v for v in engine.facets[facet].values if v]
+        fmt = lambda v: f"{v} ({sum(counts.values()) if v == ALL else counts.get(v, 0):,})"
+        return st.selectbox(label, opts, format_func=fmt, key=f"f_{facet}")
+
     with st.sidebar:
-        f_fuzzy = st.text_input("💡 **智能模糊检索**", placeholder="输入关键词...")
+        st.text_input("💡 **智能模糊检索**", placeholder="输入关键词...", key="f_fuzzy")
         st.write("---")
-        f_title = st.text_input("📖 书名 (Title)")
-        f_author = st.text_input("👤 作者 (Author)")
-        f_fnf = st.selectbox("📚 类型", ["全部", "Fiction", "Nonfiction"])
-        il_opts = ["全部"] + sorted([x for x in df.iloc[:, idx['il']].unique().tolist() if str(x)!="nan"])
-        f_il = st.selectbox("🎯 Interest Level", il_opts)
-        f_word = st.number_input("📝 最小词数", min_value=0, step=100)
-        f_quiz = st.text_input("🔢 AR Quiz Number")
-        f_series = st.text_input("🔗 系列 (Series)")
-        f_topic = st.text_input("🏷️ 主题 (Topic)")
+        st.text_input("📖 书名 (Title)", key="f_title")
+        st.text_input("👤 作者 (Author)", key="f_author")
+        facet_select("📚 类型", "fnf")
+        facet_select("🎯 Interest Level", "il")
+        st.number_input("📝 最小词数", min_value=0, step=100, key="f_word")
+        st.text_input("🔢 AR Quiz Number", key="f_quiz")
+        facet_select("🔗 系列 (Series)", "series")
+        facet_select("🏷️ 主题 (Topic)", "topic")
         st.write("---")
-        f_ar = st.slider("📊 ATOS Book Level 范围", 0.0, 12.0, (0.0, 12.0))
-
-    # 筛选逻辑
-    f_df = df.copy()
-    if f_fuzzy: 
-        f_df = f_df[f_df.apply(lambda r: f_fuzzy.lower() in str(r.values).lower(), axis=1)]
-    if f_title: f_df = f_df[f_df.iloc[:, idx['title']].astype(str).str.contains(f_title, case=False)]
-    if f_author: f_df = f_df[f_df.iloc[:, idx['author']].astype(str).str.contains(f_author, case=False)]
-    if f_fnf != "全部": f_df = f_df[f_df.iloc[:, idx['fnf']] == f_fnf]
-    if f_il != "全部": f_df = f_df[f_df.iloc[:, idx['il']] == f_il]
-    if f_quiz: f_df = f_df[f_df.iloc[:, idx['quiz']].astype(str).str.contains(f_quiz)]
-    if f_series: f_df = f_df[f_df.iloc[:, idx['series']].astype(str).str.contains(f_series, case=False)]
-    if f_topic: f_df = f_df[f_df.iloc[:, idx['topic']].astype(str).str.contains(f_topic, case=False)]
-    f_df = f_df[(f_df.iloc[:, idx['ar']] >= f_ar[0]) & (f_df.iloc[:, idx['ar']] <= f_ar[1]) & (f_df.iloc[:, idx['word']] >= f_word)]
+        st.slider("📊 ATOS Book Level 范围", 0.0, 12.0, (0.0, 12.0), key="f_ar")
+        page_size = st.selectbox("🧱 每页显示", WALL_PAGE_SIZES, index=WALL_PAGE_SIZES.index(WALL_PAGE_SIZE))
+
+    # 结果是符合条件的行号；条件不变的重跑直接命中缓存，不复制任何数据
+    with trace.span("filter"):
+        ids = engine.select(criteria)
+
+    # 筛选条件变化时回到第一页
+    wall_sig = (criteria, page_size)
+    if st.session_state.wall_sig != wall_sig:
+        st.session_state.wall_sig = wall_sig
+        st.session_state.wall_page = 0
 
     tab1, tab2, tab3 = st.tabs(["📚 图书海报墙", "📊 分级分布统计", "🏆 读者高赞榜单"])
     
     with tab1:
-        if st.button("🎁 开启选书盲盒", use_container_width=True):
-            st.balloons()
-            st.session_state.blind_idx = f_df.sample(1).index[0] if not f_df.empty else df.sample(1).index[0]
-        
-        if st.session_state.blind_idx is not None:
-            b_row = df.iloc[st.session_state.blind_idx]
-            _, b_col, _ = st.columns([1, 2, 1])
-            with b_col:
-                st.markdown(f'<div class="blind-box-container"><h3>《{b_row.iloc[idx["title"]]}》</h3><p>作者: {b_row.iloc[idx["author"]]}</p></div>', unsafe_allow_html=True)
-                if st.button(f"🚀 点击进入详情", key="blind_go", use_container_width=True):
-                    st.session_state.bk_focus = st.session_state.blind_idx; st.rerun()
+        @st.fragment
+        @traced_fragment
+        def blind_box(ids):
+            """选书盲盒：抽书只重跑这一段，进入详情页才重跑整页"""
+            if st.button("🎁 开启选书盲盒", use_container_width=True):
+                st.balloons()
+                pool = ids if len(ids) else range(len(df))
+                st.session_state.blind_id = df['id'].iat[int(pool[random.randrange(len(pool))])]
+
+            if st.session_state.blind_id in book_index:
+                b_row = df.iloc[book_index[st.session_state.blind_id]]
+                _, b_col, _ = st.columns([1, 2, 1])
+                with b_col:
+                    st.markdown(f'<div class="blind-box-container"><h3>《{b_row["title"]}》</h3><p>作者: {b_row["author"]}</p></div>', unsafe_allow_html=True)
+                    if st.button(f"🚀 点击进入详情", key="blind_go", use_container_width=True):
+                        open_book(st.session_state.blind_id); st.rerun(scope="app")
+
+        blind_box(ids)
+
+        # 导出书单：data 为回调，点击下载时才由 Streamlit 调用生成文件 (不在每次重跑时生成)，同一筛选条件与格式只生成一次
+        with st.expander(f"📥 导出当前书单 ({len(ids):,} 本)"):
+            ex_fmt = st.radio("格式", available_formats(), format_func=lambda f: EXPORT_FORMATS[f][0], horizontal=True, key="export_fmt")
+            st.download_button(
+                "⬇️ 下载", data=lambda c=criteria, i=ids, f=ex_fmt, cache=get_export_cache(), d=df, v=ver: cache.get((v, c, f), d, i, f).read_bytes(),
+                file_name=f"书单-{datetime.now():%Y%m%d}.{ex_fmt}", mime=EXPORT_FORMATS[ex_fmt][1],
+                on_click="ignore", disabled=not len(ids), key="export_dl",
+            )
+
+        # 只渲染当前页：按列切片取出可见窗口，不再逐行 iterrows 整个结果集
+        n_pages = max(1, -(-len(ids) // page_size))
+        page = min(st.session_state.wall_page, n_pages - 1)
+        render_pager(page, n_pages, len(ids), "top")
+
+        trace.begin("wall")
+        win = df.iloc[ids[page * page_size:(page + 1) * page_size]]
+        tiles = zip(
+            win['id'].tolist(), win['title'].tolist(), win['author'].tolist(),
+            win['ar'].tolist(), win['word'].tolist(),
+            win['fnf'].tolist(), win['quiz'].tolist(),
+        )
+        # 可见的这一页只发一次批量读取
+        comment_counts = load_comment_counts(win['id'].tolist())
+        # 封面：本页与下一页未缓存的交给后台线程拉取，还没好的先显示占位图
+        covers = get_cover_cache()
+        if covers is not None:
+            nxt = df.iloc[ids[(page + 1) * page_size:(page + 2) * page_size]]
+            for w in (win, nxt):
+                covers.prefetch(list(zip(w['id'].tolist(), w['quiz'].tolist(), w['title'].tolist())))
+
+        @st.fragment
+        @traced_fragment
+        def tile_actions(bid):
+            """每本书的按钮：点赞只重跑这一小段 (与书目大小无关)，进入详情页才重跑整页"""
+            cl, cr = st.columns(2)
+
+            # =====================================================
+            # 点赞按钮对所有用户 (含游客) 开放
+            # =====================================================
+            # 点赞在回调中处理：回调先于本片段的重跑执行，按钮直接显示新状态，只需重跑一次
+            cl.button("❤️" if bid in st.session_state.voted else "🤍", key=f"h_{bid}", on_click=toggle_like, args=(bid,), use_container_width=True)
+
+            if cr.button("查看详情", key=f"d_{bid}", use_container_width=True):
+                open_book(bid); st.rerun(scope="app")
 
         cols = st.columns(3)
-        for i, (orig_idx, row) in enumerate(f_df.iterrows()):
+        for i, (bid, t, author, ar, word, fnf, quiz) in enumerate(tiles):
             with cols[i % 3]:
-                t = row.iloc[idx['title']]
-                voted = t in st.session_state.voted
+                cover = ""
+                if covers is not None:
+                    name = covers.get(bid)
+                    cover = f'<div class="tile-cover"><img src="{COVER_URL}{name}"></div>' if name else '<div class="tile-cover cover-placeholder">📖</div>'
                 st.markdown(f"""
                 <div class="book-tile">
+                    {cover}
                     <div class="tile-title">《{t}》</div>
-                    <div style="color:#666; font-size:0.85em; margin-bottom:10px;">{row.iloc[idx["author"]]}</div>
+                    <div style="color:#666; font-size:0.85em; margin-bottom:10px;">{author}</div>
                     <div class="tag-container">
-                        <span class="tag tag-ar">ATOS {row.iloc[idx["ar"]]}</span>
-                        <span class="tag tag-word">{row.iloc[idx["word"]]:,} 字</span>
-                        <span class="tag tag-fnf">{row.iloc[idx["fnf"]]}</span>
-                        <span class="tag tag-quiz">Q: {row.iloc[idx["quiz"]]}</span>
+                        <span class="tag tag-ar">ATOS {ar:.1f}</span>
+                        <span class="tag tag-word">{word:,} 字</span>
+                        <span class="tag tag-fnf">{fnf}</span>
+                        <span class="tag tag-quiz">Q: {quiz or " "}</span>
+                        <span class="tag tag-cmt">💬 {"…" if comment_counts is None else comment_counts.get(bid, 0)}</span>
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
                 
-                cl, cr = st.columns(2)
-                
-                # =====================================================
-                # 修改点：点赞按钮对所有用户（含游客）开放 (保持原样)
-                # =====================================================
-                if cl.button("❤️" if voted else "🤍", key=f"h_{orig_idx}", use_container_width=True):
-                    if voted: st.session_state.voted.remove(t)
-                    else: st.session_state.voted.add(t)
-                    st.rerun()
-                
-                if cr.button("查看详情", key=f"d_{orig_idx}", use_container_width=True):
-                    st.session_state.bk_focus = orig_idx; st.rerun()
+                tile_actions(bid)
+        trace.end("wall")
+
+        # 本页还有封面在拉取、或数据库尚未连上 (留言数显示为「…」) 时，每秒检查一次，全部就绪后重跑一次换下占位
+        if comment_counts is None or (covers is not None and covers.pending(win['id'].tolist())):
+            @st.fragment(run_every=1)
+            def wall_poll(book_ids):
+                covers = get_cover_cache()
+                if get_repository_loader().ready() and not (covers and covers.pending(book_ids)): st.rerun(scope="app")
+            wall_poll(win['id'].tolist())
+
+        if n_pages > 1:
+            render_pager(page, n_pages, len(ids), "bottom")
 
     with tab2:
         st.subheader("📊 ATOS Book Level 数据分布")
-        if not f_df.empty:
-            st.bar_chart(f_df.iloc[:, idx['ar']].value_counts().sort_index())
+        if len(ids):
+            with trace.span("stats"):
+                stats = get_stats_engine(ver, df).summary(criteria, ids)
+            m1, m2, m3 = st.columns(3)
+            m1.metric("📚 本数", f"{stats['n']:,}")
+            m2.metric("📊 平均 ATOS", f"{stats['ar_mean']:.1f}")
+            m3.metric("📝 词数中位数", f"{stats['word_quantiles']['P50']:,}")
+            st.caption(f"每 {ATOS_BIN} 级一档")
+            st.bar_chart(stats['atos_hist'])
+            st.write("#### 📝 词数分位数")
+            st.dataframe(stats['word_quantiles'].to_frame().T, hide_index=True, use_container_width=True)
+            st.write("#### 🎯 Interest Level × 📚 类型")
+            st.dataframe(stats['il_fnf'], use_container_width=True)
+            st.write("#### 🏷️ 主题 × Interest Level")
+            st.dataframe(stats['topic_il'], use_container_width=True)
+        else: st.info("当前筛选条件下没有图书")
 
     with tab3:
-        st.subheader("🏆 您最喜爱的图书")
+        st.subheader("🏆 全站最受欢迎")
+        top_books = load_like_board()
+        if top_books:
+            for rank, (b_id, n_likes) in enumerate(top_books, 1):
+                col_n, col_b = st.columns([3, 1])
+                with col_n: st.markdown(f"**{rank}.** {book_title(b_id)} · ❤️ {n_likes}")
+                with col_b:
+                    if b_id in book_index:
+                        if st.button("查看详情", key=f"top_{rank}"):
+                            open_book(b_id); st.rerun()
+        elif top_books is None: st.caption("榜单加载中，稍后刷新页面即可看到。")
+        else: st.info("暂无全站点赞数据，登录后点击 ❤️ 即可为好书投票。")
+
+        st.subheader("⭐ 我的收藏")
+        if not st.session_state.logged_in:
+            st.caption("游客的收藏仅在本次访问中保留，登录后可永久保存。")
         if st.session_state.voted:
-            title_to_idx = {str(row.iloc[idx['title']]): i for i, row in df.iterrows()}
-            for b_name in st.session_state.voted:
+            for b_id in st.session_state.voted:
                 col_n, col_b = st.columns([3, 1])
-                with col_n: st.markdown(f"⭐ **{b_name}**")
+                with col_n: st.markdown(f"⭐ **{book_title(b_id)}**")
                 with col_b:
-                    if b_name in title_to_idx:
-                        if st.button("查看详情", key=f"fav_{b_name}"):
-                            st.session_state.bk_focus = title_to_idx[b_name]; st.rerun()
+                    if b_id in book_index:
+                        if st.button("查看详情", key=f"fav_{b_id}"):
+                            open_book(b_id); st.rerun()
         else: st.info("暂无收藏记录，快去点击 ❤️ 吧！")
+
+# ==========================================
+# 10. 本次重跑的性能记录
+# ==========================================
+# 中途 st.rerun() 的重跑不会走到这里，只记录完整渲染的重跑
+trace.finish(view="detail" if st.session_state.bk_focus is not None else "wall", rows=len(df))
+
+# 页面渲染完后才在后台连接数据库：游客浏览图书墙不必等待 Google 相关库的导入与客户端的创建
+get_repository_loader().start()
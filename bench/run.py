@@ -0,0 +1,249 @@
+"""压测：合成书目上的解析、筛选、统计耗时，以及用 AppTest 无头重跑 app.py。
+
+    python -m bench.run                                   # 1k / 10k / 100k / 500k
+    python -m bench.run --sizes 1000 10000 --out bench_output.json
+    python -m bench.run --compare baseline.json           # 比基线慢超过阈值时退出码为 1
+
+结果写成 JSON：{"meta": {...}, "results": {"<行数>": {"<项目>": {"median_ms": ...}}}}。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from bench.synth import write_catalog
+from catalog import apply_schema, merge_catalogs
+from catalog_stats import StatsEngine
+from covers import CoverCache, DirectoryCoverSource
+from filters import FilterCriteria, FilterEngine
+from search_index import SearchIndex
+from similar import SimilarBooks
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 500_000]
+APPTEST_MAX_SIZE = 100_000  # 更大的书目只跑函数级压测，除非 --apptest-sizes 指定
+
+# 压测用的筛选组合：全部不限 / 常见的多条件组合 / 只用模糊检索
+FILTER_CASES = {
+    "none": FilterCriteria(),
+    "typical": FilterCriteria(title="the", fnf="Fiction", il="MG", word=1000, topic="Animals", ar=(2.0, 8.0)),
+    "fuzzy": FilterCriteria(fuzzy="magic"),
+}
+
+
+def timed(fn, repeat):
+    """运行 repeat 次，返回耗时统计 (毫秒)"""
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t0) * 1000)
+    runs.sort()
+    return {
+        "median_ms": round(statistics.median(runs), 3),
+        "min_ms": round(runs[0], 3),
+        "p95_ms": round(runs[min(len(runs) - 1, int(len(runs) * 0.95))], 3),
+        "n": repeat,
+    }
+
+
+def bench_functions(csv_path, n):
+    """函数级压测：CSV 解析与清洗、检索索引构建、筛选链、统计页、相似图书、封面"""
+    out = {}
+    repeat = 5 if n <= 10_000 else 3 if n <= 100_000 else 1
+    out["parse_clean"] = timed(lambda: apply_schema(pd.read_csv(csv_path)), repeat)
+    df, mem = apply_schema(pd.read_csv(csv_path))
+    out["catalog_bytes"] = {"before": mem["before"], "after": mem["after"]}
+    # 两个来源合并去重 (第二个来源与第一个有一半重合)
+    out["merge_sources"] = timed(lambda: merge_catalogs([("A", df), ("B", df.iloc[::2])]), repeat)
+    out["search_index_build"] = timed(lambda: SearchIndex(df.drop(columns="id")), 1)
+
+    out["filter_engine_build"] = timed(lambda: FilterEngine(df), repeat)
+    engine = FilterEngine(df)
+    engine.wait_index()  # 索引构建已单独计时
+    for name, crit in FILTER_CASES.items():
+        # 冷：掩码计算；热：条件不变的重跑命中缓存
+        out[f"filter_{name}"] = timed(lambda: engine.mask(crit), repeat * 3)
+        engine.select(crit)
+        out[f"filter_{name}_memo"] = timed(lambda: engine.select(crit), repeat * 3)
+    # 侧边栏各下拉框选项的计数 (未命中缓存)
+    crit = FILTER_CASES["typical"]
+    out["facet_counts"] = timed(lambda: engine.count_facets(crit), repeat * 3)
+    # 统计页：冷 (重新统计) / 热 (条件不变命中缓存)
+    stats, ids = StatsEngine(df), engine.select(FILTER_CASES["typical"])
+    out["stats_tab"] = timed(lambda: stats.compute(ids), repeat * 3)
+    stats.summary(FILTER_CASES["typical"], ids)
+    out["stats_tab_memo"] = timed(lambda: stats.summary(FILTER_CASES["typical"], ids), repeat * 3)
+    # 详情页的相似图书：全库 / 限定在筛选结果内
+    out["similar_build"] = timed(lambda: SimilarBooks(df), repeat)
+    sim = SimilarBooks(df)
+    out["similar_query"] = timed(lambda: sim.query(n // 2), repeat * 3)
+    within = engine.select(FILTER_CASES["typical"])
+    out["similar_query_within"] = timed(lambda: sim.query(n // 2, within=within), repeat * 3)
+    out.update(bench_covers(df))
+    return out
+
+
+def bench_covers(df, page_size=24):
+    """图书墙一页的封面：冷 (后台拉取并缩放到全部就绪) / 热 (已在磁盘缓存中)"""
+    from PIL import Image
+
+    page = list(zip(df['id'].tolist()[:page_size], df['quiz'].tolist()[:page_size], df['title'].tolist()[:page_size]))
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp, "src")
+        src.mkdir()
+        for i, (bid, _, _) in enumerate(page):
+            Image.new("RGB", (800, 1200), (i * 10 % 256, 120, 200)).save(src / f"{bid}.jpg", quality=90)
+        covers = CoverCache(DirectoryCoverSource(src), Path(tmp, "cache"))
+        ids = [b[0] for b in page]
+
+        def cold():
+            covers.prefetch(page)
+            while covers.pending(ids):
+                time.sleep(0.001)
+
+        return {
+            "cover_page_cold": timed(cold, 1),
+            "cover_page_warm": timed(lambda: [covers.get(b) for b in ids], 15),
+        }
+
+
+def _first_key(at, prefix):
+    return next(b.key for b in at.button if b.key and b.key.startswith(prefix))
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def bench_apptest(csv_path, snapshot_dir, repeat=5):
+    """无头重跑 app.py：首次运行、图书墙重跑、点赞、翻页、模糊检索、详情页、选书盲盒"""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.update(CATALOG_URL=str(csv_path), CATALOG_SNAPSHOT_DIR=str(snapshot_dir), DATA_BACKEND="memory")
+    out = {}
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=600)
+
+    def run(make=None):
+        """make() 完成一次界面操作 (点击/输入) 并返回待 run 的对象；None 表示直接重跑"""
+        t0 = time.perf_counter()
+        (make() if make else at).run()
+        ms = (time.perf_counter() - t0) * 1000
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        return ms
+
+    def series(make, n=repeat):
+        runs = sorted(run(make) for _ in range(n))
+        return {"median_ms": round(statistics.median(runs), 3), "min_ms": round(runs[0], 3), "n": n}
+
+    def fuzzy():
+        return next(x for x in at.text_input if "模糊" in x.label)
+
+    out["first_run"] = {"median_ms": round(run(), 3), "n": 1}
+    out["wall_rerun"] = series(None)
+    out["wall_like"] = series(lambda: at.button(key=_first_key(at, "h_")).click())
+    out["wall_next_page"] = series(lambda: at.button(key="pg_next_top").click(), 1)
+    out["wall_fuzzy"] = series(lambda: fuzzy().input("magic"), 1)
+    fuzzy().input("").run()
+    out["blind_box"] = series(lambda: _button(at, "🎁 开启选书盲盒").click())
+    out["detail_open"] = series(lambda: at.button(key=_first_key(at, "d_")).click(), 1)
+    out["detail_rerun"] = series(None)
+    return out
+
+
+def bench_cold_start(csv_path, snapshot_dir, repeat=3, env=None):
+    """新进程中首次渲染 app.py 的耗时 (进程刚启动、尚未导入任何依赖；目录快照已在磁盘上)"""
+    code = (
+        "import sys, time\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "at = AppTest.from_file(sys.argv[1], default_timeout=600)\n"
+        "t0 = time.perf_counter(); at.run(); print((time.perf_counter() - t0) * 1000)\n"
+        "if at.exception: sys.exit(str(at.exception[0].value))\n"
+    )
+    env = {**os.environ, "CATALOG_URL": str(csv_path), "CATALOG_SNAPSHOT_DIR": str(snapshot_dir),
+           "DATA_BACKEND": "memory", **(env or {})}
+    runs = []
+    for _ in range(repeat):
+        p = subprocess.run([sys.executable, "-c", code, str(ROOT / "app.py")], cwd=ROOT, env=env,
+                           capture_output=True, text=True, check=True)
+        runs.append(float(p.stdout.strip().splitlines()[-1]))
+    runs.sort()
+    return {"median_ms": round(statistics.median(runs), 3), "min_ms": round(runs[0], 3), "n": repeat}
+
+
+def _meta():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    import numpy, streamlit
+    return {
+        "commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+        "pandas": pd.__version__, "numpy": numpy.__version__, "streamlit": streamlit.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """逐项比较中位数，返回变慢超过 tolerance (比例) 的项目"""
+    slower = []
+    for size, benches in report["results"].items():
+        for name, cur in benches.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if not old or "median_ms" not in cur or not old.get("median_ms"):
+                continue
+            ratio = cur["median_ms"] / old["median_ms"]
+            if ratio > 1 + tolerance:
+                slower.append((size, name, old["median_ms"], cur["median_ms"], ratio))
+    return slower
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    ap.add_argument("--apptest-sizes", type=int, nargs="*", help=f"跑 AppTest 的行数，默认不超过 {APPTEST_MAX_SIZE:,} 的全部 --sizes")
+    ap.add_argument("--out", default="bench_output.json")
+    ap.add_argument("--compare", help="基线报告 (JSON)")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="允许的变慢比例，默认 0.25")
+    args = ap.parse_args(argv)
+    apptest_sizes = args.apptest_sizes if args.apptest_sizes is not None else [n for n in args.sizes if n <= APPTEST_MAX_SIZE]
+
+    import streamlit as st
+
+    report = {"meta": _meta(), "results": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            csv_path = write_catalog(n, Path(tmp) / f"catalog-{n}.csv")
+            print(f"[{n:,}] 函数级压测 ...", flush=True)
+            res = bench_functions(csv_path, n)
+            if n in apptest_sizes:
+                print(f"[{n:,}] AppTest 重跑 ...", flush=True)
+                res.update({f"app_{k}": v for k, v in bench_apptest(csv_path, Path(tmp) / "snap").items()})
+                res["app_cold_first_run"] = bench_cold_start(csv_path, Path(tmp) / "snap")
+                st.cache_resource.clear()
+            report["results"][str(n)] = res
+
+    Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"报告已写入 {args.out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        slower = compare(report, baseline, args.tolerance)
+        for size, name, old, cur, ratio in slower:
+            print(f"变慢: [{size}] {name}: {old:.1f} ms -> {cur:.1f} ms (x{ratio:.2f})")
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""按发布表格的列布局生成合成书目 CSV，用于压测。
+
+    python -m bench.synth 10000 /tmp/catalog-10k.csv
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from catalog import CATALOG_SCHEMA
+
+_WORDS = (
+    "moon river secret garden dragon magic school friend dog cat island night winter summer "
+    "lost found little big journey star ocean forest king queen robot time city farm brave "
+    "wild mystery adventure letter family storm light shadow song dream castle bridge"
+).split()
+_FIRST = "Anna Ben Carlos Dana Eli Fay Gus Hana Ivan Jo Kim Leo Mia Noor Omar Pia Ravi Sara Tom Yuki".split()
+_LAST = "Adams Brown Chen Davis Evans Garcia Hill Ito Jones Kumar Lee Moore Nguyen Park Reed Smith Wang White".split()
+_CN = [
+    "这本书讲述了一个关于友谊和成长的故事", "语言简单，适合刚开始独立阅读的孩子", "情节紧凑，读起来停不下来",
+    "插图精美，能帮助理解故事内容", "主人公勇敢面对困难，很有启发", "适合亲子共读，也适合课堂讨论",
+    "科普知识丰富，满足孩子的好奇心", "结尾出人意料，值得反复阅读", "描写细腻，能学到很多好词好句",
+    "系列中的经典之作，推荐从第一本读起",
+]
+_TOPICS = [
+    "Animals", "Adventure", "Family", "Friendship", "Science", "History", "Mystery", "Fantasy",
+    "Sports", "School", "Nature", "Humor", "Biography", "Space", "Ocean", "Art", "Music", "Holidays",
+]
+_IL = ["LG", "MG", "MG+", "UG"]
+
+
+def _pick(rng, options, n):
+    return pd.Series(np.asarray(options, dtype=object)[rng.integers(0, len(options), n)])
+
+
+def make_catalog(n, seed=0):
+    """返回与发布表格同列布局 (A 列起) 的原始 DataFrame，全部为字符串"""
+    rng = np.random.default_rng(seed)
+    width = max(pos for _, pos, _ in CATALOG_SCHEMA) + 1
+    cols = {i: pd.Series([""] * n, dtype=object) for i in range(width)}
+
+    title = _pick(rng, _WORDS, n).str.title()
+    for _ in range(rng.integers(1, 4)):
+        title = title + " " + _pick(rng, _WORDS, n)
+    quiz = pd.Series(rng.permutation(np.arange(100000, 100000 + n)).astype(str), dtype=object)
+    quiz[rng.random(n) < 0.05] = ""          # 少量无 Quiz 号
+    word = pd.Series(rng.lognormal(9.5, 1.2, n).astype(int).astype(str), dtype=object)
+    word[rng.random(n) < 0.03] = ""
+    n_series = max(1, n // 20)
+    series = "Series " + pd.Series(rng.integers(0, n_series, n)).astype(str)
+    series[rng.random(n) < 0.6] = ""         # 大部分书不属于系列
+
+    cols[0] = pd.Series(["2024/09/01"] * n, dtype=object)
+    cols[1] = _pick(rng, _IL, n)
+    cols[2] = "Teacher " + _pick(rng, _LAST, n)
+    cols[3] = title + " " + pd.Series(np.arange(n)).astype(str)
+    cols[4] = _pick(rng, _FIRST, n) + " " + _pick(rng, _LAST, n)
+    cols[5] = pd.Series(np.round(rng.uniform(0.5, 12.0, n), 1).astype(str), dtype=object)
+    cols[6] = pd.Series(np.round(rng.uniform(0.5, 20.0, n), 1).astype(str), dtype=object)
+    cols[7] = quiz
+    cols[8] = word
+    cols[10] = "A " + _pick(rng, _WORDS, n) + " story about " + _pick(rng, _WORDS, n) + " and " + _pick(rng, _WORDS, n) + "."
+    cols[12] = _pick(rng, _CN, n) + "，" + _pick(rng, _CN, n) + "。"
+    cols[14] = _pick(rng, ["Fiction", "Fiction", "Nonfiction"], n)
+    cols[15] = _pick(rng, _TOPICS, n)
+    cols[16] = series
+
+    header = [f"col{i}" for i in range(width)]
+    for key, pos, _ in CATALOG_SCHEMA:
+        header[pos] = key
+    return pd.DataFrame({h: cols[i] for i, h in enumerate(header)})
+
+
+def write_catalog(n, path, seed=0):
+    make_catalog(n, seed).to_csv(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    write_catalog(int(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 图书目录的列结构 (Google Sheets 发布的 CSV)
+# ==========================================
+# 列位置基于 0 开始计数：A=0, B=1 ... K=10, M=12。
+# 只保留下表中的列，其余表格列在加载时直接丢弃。
+CATALOG_SCHEMA = [
+    # (列名, 列位置, 类型)
+    ("il", 1, "category"),        # B列: Interest Level
+    ("rec", 2, "category"),       # C列: 推荐人
+    ("title", 3, "text"),         # D列: 书名
+    ("author", 4, "text"),        # E列: 作者
+    ("ar", 5, "float32"),         # F列: ATOS
+    ("quiz", 7, "int32"),         # H列: Quiz No (缺失记为 0)
+    ("word", 8, "int32"),         # I列: Word Count (缺失记为 0)
+    ("en", 10, "text"),           # K列: 英文推荐理由
+    ("cn", 12, "text"),           # M列: 中文推荐理由
+    ("fnf", 14, "category"),      # O列: Fiction/Nonfiction
+    ("topic", 15, "category"),    # P列: Topic
+    ("series", 16, "category"),   # Q列: Series
+]
+
+# 加载时派生的列 (不在表格中)；变更后旧的本地快照作废
+DERIVED_COLUMNS = ["id"]
+
+# 表格结构漂移检测阈值
+MIN_NUMERIC_RATIO = 0.8     # 数值列中可解析为数字的非空单元格占比下限
+MAX_LEVELS = {"il": 20, "fnf": 10}  # 这些分类列的取值个数上限
+
+
+class CatalogSchemaError(ValueError):
+    """表格列结构与 CATALOG_SCHEMA 不符 (列被插入、删除或挪动)"""
+
+
+def _numeric(raw, key, pattern=None):
+    text = raw.astype(str).str.strip()
+    filled = raw.notna() & (text != "")
+    if pattern:
+        text = text.str.extract(pattern)[0]
+    num = pd.to_numeric(text, errors="coerce")
+    n = int(filled.sum())
+    if n and num[filled].notna().sum() < MIN_NUMERIC_RATIO * n:
+        raise CatalogSchemaError(f"列 {key} 中只有 {num[filled].notna().sum()}/{n} 个单元格是数字，表格列可能发生了移动")
+    return num
+
+
+def _text(raw):
+    return raw.fillna("").astype(str).str.strip()
+
+
+def book_ids(df):
+    """稳定的图书 ID：有 Quiz 号的为 q<Quiz号>，否则为 h<书名+作者的哈希>；
+    重复的 ID 按出现顺序依次加 -2、-3 ... (ID 中不会出现其它 "-"，因此去重后仍唯一)"""
+    ids = "q" + df['quiz'].astype(str)
+    no_quiz = (df['quiz'] <= 0).to_numpy()
+    if no_quiz.any():
+        keys = df['title'][no_quiz].str.lower() + "\n" + df['author'][no_quiz].str.lower()
+        ids[no_quiz] = ["h" + hashlib.sha1(k.encode()).hexdigest()[:10] for k in keys]
+    dup = ids.groupby(ids, sort=False).cumcount()
+    return ids.where(dup == 0, ids + "-" + (dup + 1).astype(str))
+
+
+def merge_catalogs(parts):
+    """按顺序合并多个来源的目录 [(来源名, df)]。同一本书 (Quiz 号相同；无 Quiz 号时书名+作者相同)
+    只保留最先收录它的来源中的行，source 列记下收录它的所有来源；合并后重新分配图书 ID。
+    只在来源之间去重：同一来源内重复列出的书 (如不同推荐人各写一份理由) 全部保留，ID 依次加 -2、-3"""
+    names = [name for name, _ in parts]
+    merged = pd.concat([df.drop(columns="id", errors="ignore") for _, df in parts], ignore_index=True)
+    part = np.repeat(np.arange(len(parts)), [len(df) for _, df in parts])
+    key = "q" + merged['quiz'].astype(str)
+    no_quiz = (merged['quiz'] <= 0).to_numpy()
+    key[no_quiz] = "t" + merged['title'][no_quiz].str.lower() + "\n" + merged['author'][no_quiz].str.lower()
+    codes, uniq_keys = pd.factorize(key)
+    # 每本书 (key 编号) 被哪些来源收录记成位掩码，再按掩码映射为「来源1, 来源2」
+    book_mask = np.zeros(len(uniq_keys), dtype=np.int64)
+    for i in range(len(parts)):
+        book_mask[codes[part == i]] |= 1 << i
+    # 每本书归属最先收录它的来源 (首次出现的行所在的来源)
+    first_row = np.unique(codes, return_index=True)[1]
+    owner = np.empty(len(uniq_keys), dtype=part.dtype)
+    owner[codes[first_row]] = part[first_row]
+    keep = part == owner[codes]
+    out = merged[keep].reset_index(drop=True)
+    mask = book_mask[codes[keep]]
+    uniq, codes = np.unique(mask, return_inverse=True)
+    labels = [", ".join(n for i, n in enumerate(names) if m >> i & 1) for m in uniq]
+    out['source'] = pd.Categorical.from_codes(codes, categories=labels)
+    # 各来源的分类取值不同，合并后重新转成分类列
+    for k, _, kind in CATALOG_SCHEMA:
+        if kind == "category":
+            out[k] = out[k].astype(str).astype("category")
+    out['id'] = book_ids(out)
+    return out
+
+
+def apply_schema(raw):
+    """把原始表格转成按列名访问的紧凑目录，返回 (df, 内存报告)"""
+    width = max(pos for _, pos, _ in CATALOG_SCHEMA) + 1
+    if raw.shape[1] < width:
+        raise CatalogSchemaError(f"表格只有 {raw.shape[1]} 列，至少需要 {width} 列")
+
+    cols = {}
+    for key, pos, kind in CATALOG_SCHEMA:
+        col = raw.iloc[:, pos]
+        if kind == "float32":
+            # 提取 AR 数字，如 "4.5 (MG)" -> 4.5
+            cols[key] = _numeric(col, key, r"(\d+\.?\d*)").fillna(0.0).astype(np.float32)
+        elif kind == "int32":
+            cols[key] = _numeric(col, key).fillna(0).astype(np.int32)
+        elif kind == "category":
+            cols[key] = _text(col).astype("category")
+            limit = MAX_LEVELS.get(key)
+            if limit and len(cols[key].cat.categories) > limit:
+                raise CatalogSchemaError(f"列 {key} 出现 {len(cols[key].cat.categories)} 种取值 (上限 {limit})，表格列可能发生了移动")
+        else:
+            cols[key] = _text(col)
+    df = pd.DataFrame(cols).reset_index(drop=True)
+    df["id"] = book_ids(df)
+
+    report = {
+        "rows": len(df),
+        "before": int(raw.memory_usage(deep=True).sum()),
+        "after": int(df.memory_usage(deep=True).sum()),
+    }
+    logger.info("catalog: %d 行，内存 %.1f MB -> %.1f MB", report["rows"], report["before"] / 2**20, report["after"] / 2**20)
+    return df, report
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 分级分布统计 (统计页)
+# ==========================================
+# 每个目录版本预先算好各行的 ATOS 分箱号、分类编号；统计时只对筛选结果的行号做 bincount，
+# 结果按筛选条件缓存，条件不变的重跑不再重新统计。
+
+ATOS_BIN = 0.5          # ATOS 直方图的分箱宽度
+ATOS_MAX = 12.0         # 超过的并入最后一箱 (与侧边栏滑块上限一致)
+WORD_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+TOPIC_ROWS = 15         # 主题交叉表只列出本数最多的前几个主题
+BLANK = "未填"          # 分类列空值的显示名
+
+
+class _Codes:
+    """分类列的取值编号与显示名"""
+
+    def __init__(self, col):
+        self.codes = col.cat.codes.to_numpy().astype(np.int64)
+        self.labels = [str(v) or BLANK for v in col.cat.categories]
+
+
+def _crosstab(a, b, ids):
+    """两个分类列在 ids 行上的交叉计数，去掉全为 0 的行与列"""
+    ka, kb = len(a.labels), len(b.labels)
+    n = np.bincount(a.codes[ids] * kb + b.codes[ids], minlength=ka * kb).reshape(ka, kb)
+    t = pd.DataFrame(n, index=a.labels, columns=b.labels)
+    return t.loc[t.sum(axis=1) > 0, t.sum(axis=0) > 0]
+
+
+class StatsEngine:
+    """每个目录版本构建一次；summary() 按筛选条件缓存统计结果"""
+
+    def __init__(self, df, cache_size=64):
+        self._n_bins = int(round(ATOS_MAX / ATOS_BIN))
+        ar = df['ar'].to_numpy()
+        self._ar = ar
+        self._ar_bin = np.clip((ar / np.float32(ATOS_BIN)).astype(np.int64), 0, self._n_bins - 1)
+        self._word = df['word'].to_numpy()
+        self._il = _Codes(df['il'])
+        self._fnf = _Codes(df['fnf'])
+        self._topic = _Codes(df['topic'])
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def compute(self, ids):
+        """ids (筛选结果的行号) 上的全部统计"""
+        ids = np.asarray(ids)
+        hist = np.bincount(self._ar_bin[ids], minlength=self._n_bins)
+        word = self._word[ids]
+        word = word[word > 0]  # 0 表示词数缺失
+        topic_il = _crosstab(self._topic, self._il, ids)
+        topic_il = topic_il.loc[topic_il.sum(axis=1).sort_values(ascending=False, kind="stable").index[:TOPIC_ROWS]]
+        return {
+            "n": len(ids),
+            "ar_mean": float(self._ar[ids].mean()) if len(ids) else 0.0,
+            "atos_hist": pd.Series(hist, index=pd.Index(np.arange(self._n_bins) * ATOS_BIN, name="ATOS"), name="本数"),
+            "word_quantiles": pd.Series(np.quantile(word, WORD_QUANTILES).round().astype(int) if len(word) else 0,
+                                        index=[f"P{int(q * 100)}" for q in WORD_QUANTILES], name="词数"),
+            "il_fnf": _crosstab(self._il, self._fnf, ids),
+            "topic_il": topic_il,
+        }
+
+    def summary(self, key, ids):
+        """同 compute；key 为筛选条件 (可哈希)，相同条件直接返回缓存"""
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = self.compute(ids)
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return value
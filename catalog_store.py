@@ -0,0 +1,250 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from catalog import CATALOG_SCHEMA, DERIVED_COLUMNS, apply_schema, merge_catalogs
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 目录加载：条件请求 + 本地快照 + 后台刷新
+# ==========================================
+# - 用 ETag / Last-Modified 发条件请求，表格未更新时服务器直接回 304；
+# - 内容哈希相同则跳过解析；
+# - 每次解析成功都写一份 Parquet 快照，冷启动先读快照，拉取失败时继续用快照；
+# - 过期后由后台线程刷新，用户请求只读当前内存中的目录，不等网络。
+
+# 列结构 (含派生列) 变化后旧快照作废
+SCHEMA_TAG = hashlib.md5(repr((CATALOG_SCHEMA, DERIVED_COLUMNS)).encode()).hexdigest()[:8]
+
+
+def parse_sources(spec):
+    """解析来源配置：逗号或换行分隔的「名称=地址」，名称可省略 (默认为 来源1、来源2 ...)"""
+    sources = []
+    for item in spec.replace("\n", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep or "://" in name or "/" in name:  # 没有名称，「=」出现在地址里
+            name, url = "", item
+        sources.append((name.strip() or f"来源{len(sources) + 1}", url.strip()))
+    return sources
+
+
+def _as_url(src):
+    """本地路径转成 file:// URL，便于用本地文件测试"""
+    if "://" in src:
+        return src
+    return Path(src).resolve().as_uri()
+
+
+class CatalogStore:
+    """进程内共享的目录：get() 立即返回当前版本，必要时在后台重新拉取"""
+
+    def __init__(self, url, snapshot_dir, ttl=600, timeout=20, retry=30):
+        self.url = _as_url(url)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry = retry        # 冷启动拉取失败后，隔多少秒才再试
+        self.df = None
+        self.version = ""
+        self.checked_at = 0.0     # 上次与源站确认的时间
+        self.updated_at = None    # 当前内容的拉取时间
+        self.error = None         # 最近一次刷新失败的原因，成功后清空
+        self._etag = None
+        self._last_modified = None
+        self._lock = threading.Lock()
+        self._cold_lock = threading.Lock()
+        self._refreshing = False
+
+        key = hashlib.md5(self.url.encode()).hexdigest()[:12]
+        self._dir = Path(snapshot_dir)
+        self._data_path = self._dir / f"catalog-{key}.parquet"
+        self._meta_path = self._dir / f"catalog-{key}.json"
+        self._load_snapshot()
+
+    # ---------- 快照 ----------
+    def _load_snapshot(self):
+        try:
+            meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+            if meta.get("schema") != SCHEMA_TAG:
+                return
+            self.df = pd.read_parquet(self._data_path)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("catalog: 快照读取失败，忽略: %s", e)
+            return
+        self.version = meta["version"]
+        self.updated_at = meta.get("updated_at")
+        self._etag = meta.get("etag")
+        self._last_modified = meta.get("last_modified")
+        logger.info("catalog: 已从快照载入 %d 行 (%s)", len(self.df), self.version[:8])
+
+    def _save_snapshot(self):
+        meta = {
+            "schema": SCHEMA_TAG, "version": self.version, "updated_at": self.updated_at,
+            "etag": self._etag, "last_modified": self._last_modified,
+        }
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            tmp = self._data_path.with_suffix(".tmp")
+            self.df.to_parquet(tmp, index=False)
+            os.replace(tmp, self._data_path)
+            self._meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        except Exception as e:
+            logger.warning("catalog: 快照写入失败: %s", e)
+
+    # ---------- 拉取 ----------
+    def _fetch(self):
+        """条件请求；内容未变 (304) 时返回 None"""
+        req = urllib.request.Request(self.url)
+        if self._etag:
+            req.add_header("If-None-Match", self._etag)
+        if self._last_modified:
+            req.add_header("If-Modified-Since", self._last_modified)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                body = resp.read()
+                headers = resp.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+        self._etag = headers.get("ETag") or self._etag
+        self._last_modified = headers.get("Last-Modified") or self._last_modified
+        return body
+
+    def refresh(self):
+        """与源站同步一次；失败时保留当前目录并记录 error"""
+        try:
+            body = self._fetch()
+            if body is not None:
+                version = hashlib.sha256(body).hexdigest()
+                if version != self.version:
+                    df, _ = apply_schema(pd.read_csv(io.BytesIO(body)))
+                    with self._lock:
+                        self.df, self.version = df, version
+                    self.updated_at = time.time()
+                    self._save_snapshot()
+                    logger.info("catalog: 已更新到 %s (%d 行)", version[:8], len(df))
+            self.error = None
+        except Exception as e:
+            self.error = e
+            logger.warning("catalog: 刷新失败，继续使用当前版本: %s", e)
+            if self.df is None:
+                raise
+        finally:
+            self.checked_at = time.time()
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="catalog-refresh", daemon=True).start()
+
+    def get(self):
+        """返回 (df, version)；只有既无内存目录也无快照时才同步等待拉取"""
+        if self.df is None:
+            with self._cold_lock:
+                if self.df is None:
+                    if self.error is not None and time.time() - self.checked_at < self.retry:
+                        raise self.error
+                    self.refresh()
+        elif time.time() - self.checked_at > self.ttl:
+            self._refresh_in_background()
+        with self._lock:
+            return self.df, self.version
+
+
+class MultiCatalogStore:
+    """多个来源 (如各校区、各学段的表格) 各自一个 CatalogStore，合并为一份去重后的目录。
+
+    - 冷启动 (还没有合并好的目录) 时在线程池里并发拉取各来源，等到第一个来源成功 (最多 timeout 秒)；
+      较慢的来源不挡住其它来源，在后台继续拉取，拉取完成后的 get() 再并入；只有一个来源时直接同步拉取；
+    - 之后各来源按自己的 ttl 在后台刷新，只有某个来源的内容变化时才重新合并。
+    """
+
+    def __init__(self, sources, snapshot_dir, ttl=600, timeout=20):
+        self.names = [name for name, _ in sources]
+        self.stores = [CatalogStore(url, snapshot_dir, ttl=ttl, timeout=timeout) for _, url in sources]
+        self.timeout = timeout
+        self.errors = {}          # 来源名 -> 最近一次失败的原因
+        self.df = None
+        self.version = ""
+        self._lock = threading.Lock()
+        self._pending = {}        # 来源序号 -> 冷启动拉取的 Future
+        self._pool = ThreadPoolExecutor(max_workers=len(self.stores), thread_name_prefix="catalog-source")
+
+    def _fetch_all(self):
+        """取各来源的 (df, version)，返回 ({来源名: 结果}, {来源名: 异常})"""
+        results, errors, cold = {}, {}, []
+        if len(self.stores) == 1:
+            # 只有一个来源：不经过线程池，冷启动时同步等待拉取 (超时见 CatalogStore.timeout)
+            try:
+                results[self.names[0]] = self.stores[0].get()
+            except Exception as e:
+                errors[self.names[0]] = e
+            return results, errors
+        for i, store in enumerate(self.stores):
+            if store.df is not None:
+                # 已载入的来源 get() 立即返回 (过期的在后台刷新)，无需经过线程池
+                results[self.names[i]] = store.get()
+            else:
+                cold.append(i)
+        if not cold:
+            return results, errors
+        with self._lock:
+            for i in cold:
+                # 上次提交的拉取还没结束的来源不重复提交
+                if i not in self._pending or self._pending[i].done():
+                    self._pending[i] = self._pool.submit(self.stores[i].get)
+            futures = {i: self._pending[i] for i in cold}
+        # 还没有任何可用的来源时，等到第一个来源拉取成功 (最多 timeout 秒)；
+        # 已有可用的来源时不再等待，仍在拉取的来源留到之后的 get() 再并入
+        if self.df is None and not results:
+            deadline = time.monotonic() + self.timeout
+            pending = set(futures.values())
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done or any(f.exception() is None for f in done):
+                    break
+        for i, f in futures.items():
+            if not f.done():
+                errors[self.names[i]] = TimeoutError("尚未返回，后台继续拉取")
+            elif f.exception() is not None:
+                errors[self.names[i]] = f.exception()
+            else:
+                results[self.names[i]] = f.result()
+        return results, errors
+
+    def get(self):
+        """返回 (df, version)；只要有一个来源可用就不抛异常，失败的来源记在 errors"""
+        results, errors = self._fetch_all()
+        for name, store in zip(self.names, self.stores):
+            if store.error is not None and name not in errors:
+                errors[name] = store.error
+        self.errors = errors
+        if not results:
+            raise next(iter(errors.values()))
+        parts = [(name, results[name]) for name in self.names if name in results]
+        version = hashlib.sha256("|".join(f"{n}:{v}" for n, (_, v) in parts).encode()).hexdigest()
+        with self._lock:
+            if version != self.version:
+                df = merge_catalogs([(n, d) for n, (d, _) in parts])
+                logger.info("catalog: 合并 %d 个来源，共 %d 行 (去重前 %d 行)", len(parts), len(df), sum(len(d) for _, (d, _) in parts))
+                self.df, self.version = df, version
+            return self.df, self.version
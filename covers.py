@@ -0,0 +1,178 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 图书封面：可替换的封面来源 + 缩略图缓存
+# ==========================================
+# - 封面来源：本地目录 (DirectoryCoverSource) 或 URL 模板 (HttpCoverSource)；
+# - 图书墙只调用 get()，从不等待网络：未缓存的封面由 prefetch() 交给后台线程拉取、缩放，
+#   期间显示占位图；
+# - 缩略图只缩放一次，存在大小有上限的磁盘 LRU 缓存中 (所有会话共享)；get() 只返回文件名，
+#   图片由 Streamlit 的静态文件服务按路径提供，不随页面重跑重复发送，浏览器也能缓存。
+
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+_UNSAFE = re.compile(r'[\\/:*?"<>|]')
+
+
+class CoverSource(ABC):
+    """封面来源：fetch() 返回原图字节，没有封面时返回 None"""
+
+    @abstractmethod
+    def fetch(self, book_id, quiz, title):
+        """在后台线程中调用，可以阻塞"""
+
+
+class DirectoryCoverSource(CoverSource):
+    """本地目录：依次查找 <Quiz号>.jpg、<图书 ID>.jpg、<书名>.jpg (也支持 png / webp)"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def fetch(self, book_id, quiz, title):
+        stems = ([str(quiz)] if quiz else []) + [book_id, _UNSAFE.sub("_", title)]
+        for stem in stems:
+            for ext in _IMAGE_EXTS:
+                path = self.root / f"{stem}{ext}"
+                if path.is_file():
+                    return path.read_bytes()
+        return None
+
+
+class HttpCoverSource(CoverSource):
+    """URL 模板，可用 {quiz} {id} {title}，如 https://covers.example.com/{quiz}.jpg；404 视为没有封面"""
+
+    def __init__(self, template, timeout=10):
+        self.template = template
+        self.timeout = timeout
+
+    def fetch(self, book_id, quiz, title):
+        if "{quiz}" in self.template and not quiz:
+            return None
+        url = self.template.format(quiz=quiz, id=book_id, title=urllib.parse.quote(title))
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as resp:
+                return resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+
+def cover_source_from_spec(spec):
+    """「http(s)://...」为 URL 模板，其它视为本地目录；空值表示不显示封面"""
+    if not spec:
+        return None
+    if spec.startswith(("http://", "https://")):
+        return HttpCoverSource(spec)
+    return DirectoryCoverSource(spec)
+
+
+class CoverCache:
+    """缩略图缓存：磁盘上按最近使用淘汰 (总大小不超过 max_bytes)"""
+
+    def __init__(self, source, cache_dir, max_bytes=200 * 2**20, size=(240, 360), workers=4, miss_ttl=3600):
+        self.source = source
+        self.size = size
+        self.max_bytes = max_bytes
+        self.miss_ttl = miss_ttl      # 没有封面或拉取失败的书，隔多久再试
+        self._dir = Path(cache_dir)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._missing = {}            # 图书 ID -> 上次失败的时间
+        self._pending = set()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cover")
+        # 磁盘索引：文件名 -> 字节数，最久未用的在前 (重启后按修改时间恢复顺序)
+        files = sorted(self._dir.glob("*.jpg"), key=lambda p: p.stat().st_mtime)
+        self._disk = OrderedDict((p.name, p.stat().st_size) for p in files)
+        self._disk_bytes = sum(self._disk.values())
+
+    @staticmethod
+    def _name(book_id):
+        return hashlib.sha1(book_id.encode()).hexdigest()[:20] + ".jpg"
+
+    def get(self, book_id):
+        """已就绪的缩略图在缓存目录中的文件名；尚未缓存时返回 None，不会发起拉取，也不读取图片内容"""
+        name = self._name(book_id)
+        with self._lock:
+            if name not in self._disk:
+                return None
+            self._disk.move_to_end(name)
+        try:
+            os.utime(self._dir / name)  # 修改时间即最近使用时间，重启后据此恢复淘汰顺序
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(name, 0)
+            return None
+        return name
+
+    def prefetch(self, books):
+        """books 为 [(图书 ID, Quiz 号, 书名)]；未缓存的封面交给后台线程拉取并缩放"""
+        now = time.time()
+        with self._lock:
+            todo = [b for b in books
+                    if b[0] not in self._pending and self._name(b[0]) not in self._disk
+                    and now - self._missing.get(b[0], 0.0) > self.miss_ttl]
+            self._pending.update(b[0] for b in todo)
+        for b in todo:
+            self._pool.submit(self._load, *b)
+        return len(todo)
+
+    def pending(self, book_ids):
+        """book_ids 中仍在后台拉取的"""
+        with self._lock:
+            return [b for b in book_ids if b in self._pending]
+
+    def _load(self, book_id, quiz, title):
+        try:
+            raw = self.source.fetch(book_id, quiz, title)
+            if raw is None:
+                self._missing[book_id] = time.time()
+                return
+            self._store(book_id, self._thumbnail(raw))
+        except Exception as e:
+            logger.warning("covers: %s 封面拉取失败: %s", book_id, e)
+            self._missing[book_id] = time.time()
+        finally:
+            with self._lock:
+                self._pending.discard(book_id)
+
+    def _thumbnail(self, raw):
+        from PIL import Image  # 只在后台缩放时才导入，未配置封面时不拖慢启动
+
+        with Image.open(io.BytesIO(raw)) as im:
+            im = im.convert("RGB")
+            im.thumbnail(self.size)
+            buf = io.BytesIO()
+            im.save(buf, "JPEG", quality=82, optimize=True)
+            return buf.getvalue()
+
+    def _store(self, book_id, data):
+        name = self._name(book_id)
+        path = self._dir / name
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        evict = []
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(name, 0)
+            self._disk[name] = len(data)
+            while self._disk_bytes > self.max_bytes and len(self._disk) > 1:
+                old, n = self._disk.popitem(last=False)
+                self._disk_bytes -= n
+                evict.append(old)
+        for old in evict:
+            (self._dir / old).unlink(missing_ok=True)
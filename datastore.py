@@ -0,0 +1,265 @@
+import bisect
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# ==========================================
+# 数据访问层：用户 / 留言 / 计数 / 点赞
+# ==========================================
+# app.py 只通过 LibraryRepository 的方法读写数据，不直接接触 Firestore。
+# - FirestoreRepository: 线上使用 (也可连 Firestore 模拟器)，见 datastore_firestore.py；
+#   Google 相关的库较重，只在真正连接 Firestore 时才导入；
+# - MemoryRepository:    进程内字典，离线运行与压测用；
+# 两者都按 Firestore 的计费口径统计每个操作的文档读、写次数与耗时。
+# 图书一律以稳定的图书 ID (见 catalog.book_ids) 标识，书名只作为留言里的展示字段。
+
+LIKE_SHARDS = 10  # 每本书的点赞分片数
+
+
+class CallStats:
+    """按操作名累计：调用次数 (= 往返次数)、文档读数、文档写数、总耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ops = {}
+
+    def record(self, op, reads, writes, seconds):
+        with self._lock:
+            s = self.ops.setdefault(op, {"calls": 0, "reads": 0, "writes": 0, "ms": 0.0})
+            s["calls"] += 1
+            s["reads"] += reads
+            s["writes"] += writes
+            s["ms"] += seconds * 1000
+
+    def snapshot(self):
+        with self._lock:
+            return {op: dict(s) for op, s in self.ops.items()}
+
+    def totals(self):
+        snap = self.snapshot()
+        return {k: sum(s[k] for s in snap.values()) for k in ("calls", "reads", "writes", "ms")}
+
+    def reset(self):
+        with self._lock:
+            self.ops = {}
+
+
+class _Call:
+    """单次调用的读写计数，由 _track 记入 CallStats"""
+    reads = 0
+    writes = 0
+
+
+class LibraryRepository(ABC):
+    """所有持久化操作的接口；book_id 为图书 ID，留言游标 (cursor) 对调用方是不透明的"""
+
+    def __init__(self):
+        self.stats = CallStats()
+
+    @contextmanager
+    def _track(self, op):
+        call = _Call()
+        t0 = time.perf_counter()
+        try:
+            yield call
+        finally:
+            self.stats.record(op, call.reads, call.writes, time.perf_counter() - t0)
+
+    # ---------- 用户 ----------
+    @abstractmethod
+    def get_user(self, email):
+        """返回用户字典，不存在时返回 None"""
+
+    @abstractmethod
+    def create_user(self, email, data):
+        """新建用户"""
+
+    @abstractmethod
+    def update_user(self, email, fields):
+        """用户不存在时抛出异常"""
+
+    # ---------- 留言 ----------
+    @abstractmethod
+    def comment_page(self, book_id, limit, cursor=None):
+        """按时间倒序取一页，返回 (留言列表, 下一页游标, 是否还有更多)"""
+
+    @abstractmethod
+    def add_comment(self, data):
+        """新增留言 (data 中须含 book_id) 并把该书的留言计数 +1 (原子操作)"""
+
+    @abstractmethod
+    def update_comment(self, comment_id, fields):
+        """修改留言的部分字段"""
+
+    @abstractmethod
+    def delete_comment(self, comment_id, book_id):
+        """留言仍存在时才删除并把计数 -1 (原子操作)"""
+
+    @abstractmethod
+    def comment_counts(self, book_ids):
+        """一次往返读取多本书的留言数，返回 {图书 ID: 数量}"""
+
+    # ---------- 点赞 ----------
+    @abstractmethod
+    def user_likes(self, email):
+        """用户已点赞的图书 ID 集合"""
+
+    @abstractmethod
+    def set_like(self, email, book_id, like):
+        """点赞或取消，返回计数变化量 (+1 / -1 / 0)"""
+
+    @abstractmethod
+    def like_totals(self, since=None):
+        """汇总点赞分片，返回 {图书 ID: 点赞数}；
+        给出 since (时间戳) 时只返回此后点赞数有变化的图书，不扫描全部分片"""
+
+
+# ==========================================
+# 内存实现
+# ==========================================
+class MemoryRepository(LibraryRepository):
+    """进程内字典实现，语义与 FirestoreRepository 一致；latency 参数可模拟网络往返"""
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self._lock = threading.RLock()
+        self.users = {}
+        self.comments = {}      # id -> 留言
+        self._by_book = {}      # 图书 ID -> [(时间戳, 留言 id)] 升序
+        self.comment_totals = {}
+        self.like_shards = {}   # 图书 ID -> [各分片计数]
+        self.liked_at = {}      # 图书 ID -> 最近一次点赞/取消的时间
+
+    @contextmanager
+    def _track(self, op):
+        with super()._track(op) as call:
+            # 模拟的网络往返不占用锁，并发的请求可以重叠；锁只保护字典的读写
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                yield call
+
+    def get_user(self, email):
+        with self._track("get_user") as c:
+            c.reads = 1
+            u = self.users.get(email)
+            return dict(u) if u else None
+
+    def create_user(self, email, data):
+        with self._track("create_user") as c:
+            c.writes = 1
+            self.users[email] = {**data, "created_at": time.time()}
+
+    def update_user(self, email, fields):
+        with self._track("update_user") as c:
+            c.writes = 1
+            if email not in self.users:
+                raise KeyError(f"用户不存在: {email}")
+            self.users[email].update(fields)
+
+    def comment_page(self, book_id, limit, cursor=None):
+        with self._track("comment_page") as c:
+            keys = self._by_book.get(book_id, [])
+            # 游标为上一页最后一条的 (时间戳, id)，新的在后，倒序遍历
+            end = len(keys) if cursor is None else bisect.bisect_left(keys, cursor)
+            chunk = keys[max(0, end - limit - 1):end][::-1]
+            c.reads = max(1, len(chunk))
+            page = chunk[:limit]
+            items = [{"id": cid, **self.comments[cid]} for _, cid in page]
+            return items, (page[-1] if page else cursor), len(chunk) > limit
+
+    def add_comment(self, data):
+        with self._track("add_comment") as c:
+            c.writes = 2
+            cid = uuid.uuid4().hex[:20]
+            ts = time.time()
+            self.comments[cid] = {**data, "timestamp": ts}
+            bisect.insort(self._by_book.setdefault(data["book_id"], []), (ts, cid))
+            self.comment_totals[data["book_id"]] = self.comment_totals.get(data["book_id"], 0) + 1
+
+    def update_comment(self, comment_id, fields):
+        with self._track("update_comment") as c:
+            c.writes = 1
+            self.comments[comment_id].update(fields)
+
+    def delete_comment(self, comment_id, book_id):
+        with self._track("delete_comment") as c:
+            c.reads = 1
+            m = self.comments.pop(comment_id, None)
+            if m is None:
+                return
+            c.writes = 2
+            self._by_book[m["book_id"]].remove((m["timestamp"], comment_id))
+            self.comment_totals[book_id] = self.comment_totals.get(book_id, 0) - 1
+
+    def comment_counts(self, book_ids):
+        book_ids = list(dict.fromkeys(book_ids))
+        if not book_ids:
+            return {}
+        with self._track("comment_counts") as c:
+            c.reads = len(book_ids)
+            return {b: self.comment_totals.get(b, 0) for b in book_ids}
+
+    def user_likes(self, email):
+        with self._track("user_likes") as c:
+            c.reads = 1
+            return set((self.users.get(email) or {}).get("liked", []))
+
+    def set_like(self, email, book_id, like):
+        with self._track("set_like") as c:
+            c.reads = 1
+            user = self.users.setdefault(email, {})
+            liked = user.setdefault("liked", [])
+            if (book_id in liked) == like:
+                return 0
+            c.writes = 2
+            if like:
+                liked.append(book_id)
+            else:
+                liked.remove(book_id)
+            shards = self.like_shards.setdefault(book_id, [0] * LIKE_SHARDS)
+            shards[random.randrange(LIKE_SHARDS)] += 1 if like else -1
+            self.liked_at[book_id] = time.time()
+            return 1 if like else -1
+
+    def like_totals(self, since=None):
+        with self._track("like_totals") as c:
+            books = [b for b in self.like_shards if since is None or self.liked_at.get(b, 0.0) > since]
+            c.reads = max(1, sum(sum(1 for n in self.like_shards[b] if n) for b in books))
+            return {b: sum(self.like_shards[b]) for b in books}
+
+
+# ==========================================
+# 后台创建
+# ==========================================
+class RepositoryLoader:
+    """在后台线程中创建数据访问层 (含导入 Google 相关的库)，不阻塞页面渲染。
+    start() 只在第一次调用时开始创建；get(wait=False) 在创建完成前返回 None"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._future = None
+
+    def start(self):
+        with self._lock:
+            if self._future is None:
+                pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="repository")
+                self._future = pool.submit(self._factory)
+                pool.shutdown(wait=False)
+            return self._future
+
+    def ready(self):
+        """已创建完成 (成功或失败)"""
+        return self._future is not None and self._future.done()
+
+    def get(self, wait=True):
+        """返回数据访问层，创建失败时抛出异常；wait=True 时必要时开始创建并等待完成"""
+        if wait:
+            return self.start().result()
+        return self._future.result() if self.ready() else None
@@ -0,0 +1,173 @@
+import random
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+
+from datastore import LIKE_SHARDS, LibraryRepository
+
+# ==========================================
+# Firestore 实现
+# ==========================================
+@firestore.transactional
+def _delete_comment_tx(tx, comment_ref, stats_ref):
+    if not comment_ref.get(transaction=tx).exists:
+        return False
+    tx.delete(comment_ref)
+    tx.set(stats_ref, {"comments": firestore.Increment(-1)}, merge=True)
+    return True
+
+
+@firestore.transactional
+def _set_like_tx(tx, user_ref, shard_ref, book_id, like):
+    # 以用户的 liked 列表为准，重复点击不会重复计数
+    liked = (user_ref.get(transaction=tx).to_dict() or {}).get("liked", [])
+    if (book_id in liked) == like:
+        return 0
+    change = firestore.ArrayUnion([book_id]) if like else firestore.ArrayRemove([book_id])
+    tx.set(user_ref, {"liked": change}, merge=True)
+    tx.set(shard_ref, {"book_id": book_id, "count": firestore.Increment(1 if like else -1),
+                       "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    return 1 if like else -1
+
+
+class FirestoreRepository(LibraryRepository):
+    """集合：users / comments / book_stats/{图书 ID}/like_shards/{0..N-1}"""
+
+    def __init__(self, client):
+        super().__init__()
+        self.db = client
+
+    def _stats_ref(self, book_id):
+        # 图书 ID 只含字母、数字和 "-"，可直接作文档 ID
+        return self.db.collection("book_stats").document(book_id)
+
+    def get_user(self, email):
+        with self._track("get_user") as c:
+            c.reads = 1
+            doc = self.db.collection("users").document(email).get()
+            return doc.to_dict() if doc.exists else None
+
+    def create_user(self, email, data):
+        with self._track("create_user") as c:
+            c.writes = 1
+            self.db.collection("users").document(email).set({**data, "created_at": firestore.SERVER_TIMESTAMP})
+
+    def update_user(self, email, fields):
+        with self._track("update_user") as c:
+            c.writes = 1
+            self.db.collection("users").document(email).update(fields)
+
+    def comment_page(self, book_id, limit, cursor=None):
+        with self._track("comment_page") as c:
+            # 多取 1 条用于判断是否还有下一页 (复合索引见 firestore.indexes.json)
+            q = (self.db.collection("comments").where("book_id", "==", book_id)
+                 .order_by("timestamp", direction=firestore.Query.DESCENDING)
+                 .limit(limit + 1))
+            if cursor is not None:
+                q = q.start_after(cursor)
+            docs = list(q.stream())
+            c.reads = max(1, len(docs))
+            page = docs[:limit]
+            items = [{"id": d.id, **d.to_dict()} for d in page]
+            return items, (page[-1] if page else cursor), len(docs) > limit
+
+    def add_comment(self, data):
+        with self._track("add_comment") as c:
+            c.writes = 2
+            # 留言与计数器在同一批次中提交，要么都成功要么都失败
+            batch = self.db.batch()
+            batch.set(self.db.collection("comments").document(), {**data, "timestamp": firestore.SERVER_TIMESTAMP})
+            batch.set(self._stats_ref(data["book_id"]), {"book_id": data["book_id"], "comments": firestore.Increment(1)}, merge=True)
+            batch.commit()
+
+    def update_comment(self, comment_id, fields):
+        with self._track("update_comment") as c:
+            c.writes = 1
+            self.db.collection("comments").document(comment_id).update(fields)
+
+    def delete_comment(self, comment_id, book_id):
+        with self._track("delete_comment") as c:
+            c.reads = 1
+            done = _delete_comment_tx(self.db.transaction(), self.db.collection("comments").document(comment_id), self._stats_ref(book_id))
+            c.writes = 2 if done else 0
+
+    def comment_counts(self, book_ids):
+        book_ids = list(dict.fromkeys(book_ids))
+        if not book_ids:
+            return {}
+        with self._track("comment_counts") as c:
+            c.reads = len(book_ids)
+            counts = dict.fromkeys(book_ids, 0)
+            for s in self.db.get_all([self._stats_ref(b) for b in book_ids]):
+                if s.exists:
+                    counts[s.id] = (s.to_dict() or {}).get("comments", 0)
+            return counts
+
+    def user_likes(self, email):
+        with self._track("user_likes") as c:
+            c.reads = 1
+            doc = self.db.collection("users").document(email).get()
+            return set((doc.to_dict() or {}).get("liked", []))
+
+    def set_like(self, email, book_id, like):
+        with self._track("set_like") as c:
+            c.reads = 1
+            shard = self._stats_ref(book_id).collection("like_shards").document(str(random.randrange(LIKE_SHARDS)))
+            delta = _set_like_tx(self.db.transaction(), self.db.collection("users").document(email), shard, book_id, like)
+            c.writes = 2 if delta else 0
+            return delta
+
+    def like_totals(self, since=None):
+        with self._track("like_totals") as c:
+            totals = {}
+            if since is None:
+                for d in self.db.collection_group("like_shards").stream():
+                    c.reads += 1
+                    v = d.to_dict()
+                    totals[v.get("book_id")] = totals.get(v.get("book_id"), 0) + v.get("count", 0)
+                c.reads = max(1, c.reads)
+                return totals
+            # 先找出 since 之后写过的分片，再只读回这些书的全部分片 (其余分片未变，但总数要重新加)
+            after = datetime.fromtimestamp(since, timezone.utc)
+            for d in self.db.collection_group("like_shards").where("updated_at", ">", after).stream():
+                c.reads += 1
+                totals[d.to_dict().get("book_id")] = 0
+            totals.pop(None, None)
+            refs = [self._stats_ref(b).collection("like_shards").document(str(i))
+                    for b in totals for i in range(LIKE_SHARDS)]
+            if refs:
+                for s in self.db.get_all(refs):
+                    c.reads += 1
+                    if s.exists:
+                        totals[s.reference.parent.parent.id] += (s.to_dict() or {}).get("count", 0)
+            c.reads = max(1, c.reads)
+            return totals
+
+    def migrate_book_ids(self, title_to_id, dry_run=False):
+        """一次性迁移：按书名记录的留言补上图书 ID，并按实际留言写入各书的留言数，可重复执行。
+        返回各项的处理数量；dry_run 时只统计不写入"""
+        done = {"comments": 0, "counters": 0, "unknown": 0}
+        ops = []  # (文档, 数据, 是否合并)
+        n_comments = {}
+        for d in self.db.collection("comments").stream():
+            v = d.to_dict()
+            bid = v.get("book_id") or title_to_id.get(v.get("book"))
+            if bid is None:
+                done["unknown"] += 1
+                continue
+            n_comments[bid] = n_comments.get(bid, 0) + 1
+            if "book_id" not in v:
+                ops.append((d.reference, {"book_id": bid}, False))
+                done["comments"] += 1
+        # 留言数按实际留言重新计数 (整体覆盖，重复执行结果不变)
+        ops += [(self._stats_ref(b), {"book_id": b, "comments": n}, True) for b, n in n_comments.items()]
+        done["counters"] = len(n_comments)
+        if not dry_run:
+            writer = self.db.bulk_writer()
+            for ref, data, merge in ops:
+                if merge:
+                    writer.set(ref, data, merge=True)
+                else:
+                    writer.update(ref, data)
+            writer.close()
+        return done
@@ -0,0 +1,117 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import openpyxl
+except ImportError:  # 未安装时不提供 Excel 格式
+    openpyxl = None
+
+# ==========================================
+# 导出筛选结果 (书单)
+# ==========================================
+# 只在用户点击下载时才生成文件：按 CHUNK_ROWS 行一块写入临时文件，
+# 任何时候只有一块数据在内存中；生成的文件按 (目录版本, 筛选条件, 格式) 缓存。
+
+EXPORT_COLUMNS = [
+    # (列名, 导出后的表头)
+    ("title", "Title"), ("author", "Author"), ("ar", "ATOS"), ("quiz", "Quiz No."),
+    ("word", "Word Count"), ("il", "Interest Level"), ("fnf", "Fiction/Nonfiction"),
+    ("topic", "Topic"), ("series", "Series"), ("rec", "推荐人"), ("source", "来源"),
+]
+FORMATS = {
+    # 格式 -> (显示名, MIME)
+    "csv": ("CSV", "text/csv"),
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+}
+CHUNK_ROWS = 5000
+
+
+def available_formats():
+    return [f for f in FORMATS if f != "xlsx" or openpyxl is not None]
+
+
+def _chunks(df, ids):
+    """按块取出 ids 行的导出列 (至少产出一块，空结果也有表头)"""
+    cols = [(k, h) for k, h in EXPORT_COLUMNS if k in df.columns]
+    pos = [df.columns.get_loc(k) for k, _ in cols]
+    names = [h for _, h in cols]
+    for i in range(0, max(len(ids), 1), CHUNK_ROWS):
+        chunk = df.iloc[ids[i:i + CHUNK_ROWS], pos]
+        chunk.columns = names
+        yield chunk
+
+
+def write_export(df, ids, fmt, out):
+    """把 df 中 ids 行按 fmt 格式分块写入二进制文件对象 out"""
+    if fmt == "csv":
+        # 带 BOM，Excel 直接打开不会乱码
+        text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+        for i, chunk in enumerate(_chunks(df, ids)):
+            chunk.to_csv(text, header=i == 0, index=False)
+        text.flush()
+        text.detach()
+    elif fmt == "parquet":
+        writer = None
+        for chunk in _chunks(df, ids):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+        writer.close()
+    elif fmt == "xlsx":
+        if openpyxl is None:
+            raise ValueError("导出 Excel 需要安装 openpyxl")
+        # write_only 模式逐行写出，不在内存中保留整张表
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("书单")
+        for i, chunk in enumerate(_chunks(df, ids)):
+            if i == 0:
+                ws.append(list(chunk.columns))
+            for row in zip(*(chunk[c].tolist() for c in chunk.columns)):
+                ws.append(row)
+        wb.save(out)
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+
+class ExportCache:
+    """导出文件缓存：key 相同的导出只生成一次，超过 max_entries 个文件时删除最早的"""
+
+    def __init__(self, max_entries=16, directory=None):
+        self.max_entries = max_entries
+        self._dir = Path(directory or tempfile.mkdtemp(prefix="library-export-"))
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, df, ids, fmt):
+        """返回导出文件的路径；key 须可哈希 (如 (目录版本, 筛选条件, 格式))"""
+        with self._lock:
+            path = self._files.get(key)
+            if path is not None and path.exists():
+                self._files.move_to_end(key)
+                return path
+        path = self._dir / f"{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}.{fmt}"
+        with tempfile.NamedTemporaryFile(dir=self._dir, suffix=".part", delete=False) as f:
+            try:
+                write_export(df, ids, fmt, f)
+            except Exception:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+        with self._lock:
+            self._files[key] = path
+            while len(self._files) > self.max_entries:
+                _, old = self._files.popitem(last=False)
+                old.unlink(missing_ok=True)
+        return path
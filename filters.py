@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+from search_index import SearchIndex
+
+# ==========================================
+# 侧边栏筛选
+# ==========================================
+ALL = "全部"  # 下拉框中「不限」的选项
+FACETS = ('fnf', 'il', 'topic', 'series')  # 用下拉框精确筛选的分类列
+BITMAP_MAX_LEVELS = 256  # 取值不超过此数的分类列，为每个取值预先建好布尔位图
+
+
+class FilterCriteria(NamedTuple):
+    """侧边栏的全部筛选条件；可哈希，可直接作为缓存键或分页签名"""
+    fuzzy: str = ""
+    title: str = ""
+    author: str = ""
+    fnf: str = ALL
+    il: str = ALL
+    word: int = 0
+    quiz: str = ""
+    series: str = ALL
+    topic: str = ALL
+    ar: tuple = (0.0, 12.0)
+
+
+class Facet:
+    """分类列：取值列表 + 每行的取值编号。取值少的列为每个取值预先建好布尔位图，
+    筛选时直接与掩码求交；取值很多的列 (如系列) 按编号现场比较，避免位图占用过多内存"""
+
+    def __init__(self, col):
+        self.values = [str(v) for v in col.cat.categories]
+        self.codes = col.cat.codes.to_numpy()
+        self._pos = {v: i for i, v in enumerate(self.values)}
+        self._bitmaps = None
+        if len(self.values) <= BITMAP_MAX_LEVELS:
+            self._bitmaps = [self.codes == i for i in range(len(self.values))]
+
+    def rows(self, value):
+        """取值为 value 的行 (布尔数组)"""
+        i = self._pos.get(value)
+        if i is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self._bitmaps[i] if self._bitmaps is not None else self.codes == i
+
+    def counts(self, m):
+        """掩码 m 内每个取值的行数 {取值: 数量}，一次 bincount 算出全部取值"""
+        codes = self.codes[m]
+        n = np.bincount(codes[codes >= 0], minlength=len(self.values))
+        return dict(zip(self.values, n.tolist()))
+
+
+class FilterEngine:
+    """每个目录版本构建一次：预先规整好各列与分类位图，筛选时把全部条件合成一个布尔掩码，
+    结果 (行号数组、下拉框计数) 按筛选条件缓存，条件不变的重跑直接命中"""
+
+    def __init__(self, df, cache_size=128):
+        self.size = len(df)
+        self._df = df
+        self._title = df['title'].str.lower()
+        self._author = df['author'].str.lower()
+        self._quiz = df['quiz'].astype(str).where(df['quiz'] > 0, "")
+        self._ar = df['ar'].to_numpy()
+        self._word = df['word'].to_numpy()
+        self.facets = {k: Facet(df[k]) for k in FACETS}
+        self._index = None
+        self._index_thread = None
+        self._index_ready = threading.Event()   # 整行文字已就绪，可以检索 (可能尚未建好倒排表)
+        self._index_built = threading.Event()   # 倒排表也已建好
+        self._index_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def start_index(self):
+        """在后台线程中构建模糊检索索引 (只构建一次)；创建引擎后即调用，不必等到第一次模糊检索"""
+        with self._index_lock:
+            if self._index_thread is None:
+                self._index_thread = threading.Thread(target=self._build_index, name="search-index", daemon=True)
+                self._index_thread.start()
+
+    def _build_index(self):
+        try:
+            # 派生的图书 ID、来源名不参与模糊检索
+            self._index = SearchIndex(self._df.drop(columns=["id", "source"], errors="ignore"), build=False)
+            self._index_ready.set()
+            self._index.build()
+        finally:
+            self._index_ready.set()
+            self._index_built.set()
+
+    def wait_index(self, timeout=None):
+        """等倒排表完全建好，返回是否已建好"""
+        self.start_index()
+        return self._index_built.wait(timeout) and self._index is not None and self._index.indexed
+
+    @property
+    def search_index(self):
+        """模糊检索索引；只在整行文字尚未就绪时才等待，倒排表建好之前检索走整行扫描"""
+        self.start_index()
+        self._index_ready.wait()
+        if self._index is None:
+            raise RuntimeError("模糊检索索引构建失败")
+        return self._index
+
+    def _base_mask(self, c):
+        """分类列以外的条件合成的掩码"""
+        # ATOS 以 float32 存储，滑块边界也转成 float32 再比较，避免 3.3 这类边界值被误排除
+        m = (self._ar >= np.float32(c.ar[0])) & (self._ar <= np.float32(c.ar[1]))
+        if c.word: m &= self._word >= c.word
+        if c.title: m &= self._title.str.contains(c.title.lower(), regex=False).to_numpy(dtype=bool)
+        if c.author: m &= self._author.str.contains(c.author.lower(), regex=False).to_numpy(dtype=bool)
+        if c.quiz: m &= self._quiz.str.contains(c.quiz, regex=False).to_numpy(dtype=bool)
+        if c.fuzzy:
+            hit = np.zeros(self.size, dtype=bool)
+            hit[self.search_index.search(c.fuzzy)] = True
+            m &= hit
+        return m
+
+    def _facet_masks(self, c):
+        """已选定取值的分类列 -> 该取值的位图"""
+        return {f: self.facets[f].rows(getattr(c, f)) for f in FACETS if getattr(c, f) != ALL}
+
+    def mask(self, c):
+        """全部条件合成的布尔掩码 (长度 = 目录行数)"""
+        m = self._base_mask(c)
+        for fm in self._facet_masks(c).values():
+            m &= fm
+        return m
+
+    def _memo(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = compute()
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def select(self, c):
+        """返回符合条件的行号 (升序、只读)"""
+        def compute():
+            ids = np.flatnonzero(self.mask(c))
+            ids.flags.writeable = False
+            return ids
+        return self._memo(("ids", c), compute)
+
+    def count_facets(self, c):
+        """每个分类列在「其余条件」下各取值的命中数：{列名: {取值: 数量}}。
+        计算某一列时不套用该列自己的选择，下拉框里的数字即为改选该项后的结果数"""
+        base, fms = self._base_mask(c), self._facet_masks(c)
+        out = {}
+        for f in FACETS:
+            m = base
+            for g, fm in fms.items():
+                if g != f:
+                    m = m & fm
+            out[f] = self.facets[f].counts(m)
+        return out
+
+    def facet_counts(self, c):
+        """同 count_facets，按筛选条件缓存"""
+        return self._memo(("facets", c), lambda: self.count_facets(c))
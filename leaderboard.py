@@ -0,0 +1,95 @@
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 读者高赞榜单：进程内的 Top-N
+# ==========================================
+# 全量点赞数只在冷启动时从数据库汇总一次；之后本进程的点赞/取消按增量调整榜单，
+# 过期后只从数据库读回上次载入以来点赞数有变化的图书 (其它进程的点赞)，不再扫描所有图书。
+# 载入与刷新都在后台线程中进行，不阻塞页面；首次载入完成前榜单为空。
+
+CLOCK_SKEW = 60  # 秒；增量刷新的起点往前多留一些，容忍各机器的时钟误差
+
+
+class LikeBoard:
+    """图书 ID -> 点赞数，并维护按点赞数排序的前 n 名"""
+
+    def __init__(self, n=20, retry=60):
+        self.n = n
+        self.retry = retry       # 载入失败后隔多久再试
+        self.counts = {}
+        self.top = []            # [(图书 ID, 点赞数)]，按点赞数降序
+        self.loaded_at = 0.0
+        self.failed_at = 0.0
+        self._since = None       # 下次增量刷新从何时开始 (时间戳)；None 表示尚未全量载入
+        self._lock = threading.Lock()
+        self._loading = False
+
+    def _rebuild(self):
+        self.top = heapq.nlargest(self.n, ((b, c) for b, c in self.counts.items() if c > 0), key=lambda x: x[1])
+
+    def load(self, counts):
+        with self._lock:
+            self.counts = dict(counts)
+            self._rebuild()
+            self.loaded_at = time.time()
+
+    def update(self, counts):
+        """用数据库中的最新值替换 counts 中各书的点赞数，其它书不变"""
+        with self._lock:
+            self.counts.update(counts)
+            self._rebuild()
+            self.loaded_at = time.time()
+
+    def add(self, book, delta):
+        """点赞 +1 / 取消 -1，只在必要时才重排整个计数表"""
+        with self._lock:
+            c = max(0, self.counts.get(book, 0) + delta)
+            self.counts[book] = c
+            pos = next((i for i, (b, _) in enumerate(self.top) if b == book), None)
+            if pos is not None:
+                self.top[pos] = (book, c)
+                # 榜内的书掉票后，榜外可能有书反超，此时才需要全量重排
+                if delta < 0 and len(self.top) == self.n:
+                    self._rebuild()
+                    return
+                self.top = [x for x in self.top if x[1] > 0]
+            elif c > 0 and (len(self.top) < self.n or c > self.top[-1][1]):
+                self.top.append((book, c))
+            else:
+                return
+            self.top.sort(key=lambda x: x[1], reverse=True)
+            del self.top[self.n:]
+
+    def ensure_loaded(self, loader, ttl):
+        """未载入或已过期时在后台线程中刷新，立即返回。
+        loader(since) 返回 {图书 ID: 点赞数}：since 为 None 时汇总所有图书，否则只含 since 之后有变化的"""
+        now = time.time()
+        if self.loaded_at and now - self.loaded_at <= ttl:
+            return
+        if now - self.failed_at < self.retry:
+            return
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            started = time.time()
+            try:
+                if self._since is None:
+                    self.load(loader(None))
+                else:
+                    self.update(loader(self._since))
+                self._since = started - CLOCK_SKEW
+            except Exception as e:
+                logger.warning("leaderboard: 点赞榜载入失败: %s", e)
+                self.failed_at = time.time()
+            finally:
+                self._loading = False
+
+        threading.Thread(target=run, name="like-board-refresh", daemon=True).start()
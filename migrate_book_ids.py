@@ -0,0 +1,51 @@
+"""一次性迁移：按书名记录的留言补上图书 ID (见 catalog.book_ids)，并写入各书的留言数。
+
+    python migrate_book_ids.py --catalog <表格 CSV 地址> --dry-run   # 只统计，不写入
+    python migrate_book_ids.py --catalog <表格 CSV 地址>
+
+凭据取自 .streamlit/secrets.toml 的 [firestore]；设置了 FIRESTORE_EMULATOR_HOST 时连接模拟器。
+同名的多本书只能对应到表格中靠前的那一本。
+"""
+import argparse
+import io
+import os
+import sys
+import tomllib
+import urllib.request
+
+import pandas as pd
+from google.cloud import firestore
+from google.oauth2 import service_account
+
+from catalog import apply_schema
+from catalog_store import _as_url
+from datastore_firestore import FirestoreRepository
+
+
+def _client():
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        return firestore.Client(project=os.environ.get("GCLOUD_PROJECT", "library-app"))
+    with open(".streamlit/secrets.toml", "rb") as f:
+        key_dict = tomllib.load(f)["firestore"]
+    creds = service_account.Credentials.from_service_account_info(key_dict)
+    return firestore.Client(credentials=creds, project=key_dict["project_id"])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--catalog", default=os.environ.get("CATALOG_URL"), required="CATALOG_URL" not in os.environ,
+                    help="书目表格的 CSV 地址或本地文件 (app.CSV_URL)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    with urllib.request.urlopen(_as_url(args.catalog), timeout=60) as resp:
+        df, _ = apply_schema(pd.read_csv(io.BytesIO(resp.read())))
+    # 倒序建表，同名书保留表格中靠前的一本
+    title_to_id = dict(zip(df['title'][::-1], df['id'][::-1]))
+    done = FirestoreRepository(_client()).migrate_book_ids(title_to_id, dry_run=args.dry_run)
+    print(("[dry-run] " if args.dry_run else "") + ", ".join(f"{k}: {v}" for k, v in done.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# ==========================================
+# 性能计时：每次重跑按阶段计时
+# ==========================================
+# Trace 记录一次重跑中各阶段 (load_data / filter / wall / 数据库读取 ...) 的耗时，
+# 结束时汇入进程内共享的 PerfStats：每个阶段保留最近 window 次，给出 p50 / p95；
+# 配置了 log_path 时，每次重跑再追加一行 JSON 到日志文件，便于离线分析。
+# 片段 (st.fragment) 单独重跑时另开一个 Trace，总耗时记在「fragment:<片段名>」下，不计入整页的 total。
+
+
+class PerfStats:
+    """进程内滚动聚合：阶段名 -> 最近 window 次的耗时 (毫秒)"""
+
+    def __init__(self, window=500, log_path=None):
+        self.window = window
+        self.log_path = log_path
+        self.runs = 0
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def start(self):
+        """开始记录一次重跑"""
+        return Trace(self)
+
+    def summary(self):
+        """[{phase, n, p50_ms, p95_ms, max_ms}]，按首次出现的顺序"""
+        with self._lock:
+            phases = {k: np.asarray(v) for k, v in self._phases.items()}
+        return [
+            {"phase": k, "n": len(v), "p50_ms": round(float(np.percentile(v, 50)), 2),
+             "p95_ms": round(float(np.percentile(v, 95)), 2), "max_ms": round(float(v.max()), 2)}
+            for k, v in phases.items()
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+            self.runs = 0
+
+    def _finish(self, spans, extra):
+        with self._lock:
+            if "total" in spans:
+                self.runs += 1
+            for phase, ms in spans.items():
+                runs = self._phases.setdefault(phase, [])
+                runs.append(ms)
+                del runs[:-self.window]  # 只保留最近 window 次
+            if self.log_path:
+                record = {"ts": round(time.time(), 3), **extra, "spans": {k: round(v, 3) for k, v in spans.items()}}
+                try:
+                    with open(self.log_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except OSError:
+                    pass
+
+
+class Trace:
+    """一次重跑的计时；用 span() 包住一段代码，或成对调用 begin() / end()；同名阶段多次进入时耗时累加"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.spans = {}
+        self._open = {}           # 已 begin 尚未 end 的阶段
+        self._t0 = time.perf_counter()
+        self.finished = False
+
+    def begin(self, name):
+        self._open[name] = time.perf_counter()
+
+    def end(self, name):
+        t0 = self._open.pop(name, None)
+        if t0 is not None:
+            self.spans[name] = self.spans.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+    @contextmanager
+    def span(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def finish(self, total="total", **extra):
+        """整次重跑结束：总耗时记在 total 阶段下并汇总；extra 只写入日志"""
+        self.finished = True
+        spans = {**self.spans, total: (time.perf_counter() - self._t0) * 1000}
+        self.stats._finish(spans, extra)
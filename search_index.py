@@ -0,0 +1,128 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 智能模糊检索：倒排索引
+# ==========================================
+# 英文等非中日韩文字按单词切分；中文按字 (1-gram) 与相邻两字 (2-gram) 切分。
+# 检索时先用索引求候选行的交集，再对少量候选行做一次子串校验，
+# 因此结果与原来「关键词是否出现在整行文字中」的子串语义一致。
+# 构建分两步：整行文字 (__init__) 与倒排表 (build)；倒排表建好之前检索直接对整行文字做子串扫描。
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_WORD_RE = re.compile(rf"[^\W_{_CJK}]+")
+_CJK_RUN_RE = re.compile(rf"[{_CJK}]+")
+_CJK_UNI_RE = re.compile(rf"[{_CJK}]")
+_CJK_BI_RE = re.compile(rf"(?=([{_CJK}]{{2}}))")
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+def _postings(tokens):
+    """把每行的 token 列表 (Series of list) 转成 token -> 行号数组"""
+    flat = tokens.explode().dropna()
+    if flat.empty:
+        return {}
+    # token 先编号，再把 (编号, 行号) 压成一个 int64 排序去重，避免在字符串上做 groupby
+    codes, uniq = pd.factorize(flat.to_numpy(dtype=object))
+    rows = flat.index.to_numpy(dtype=np.int64)
+    n = int(rows.max()) + 1
+    keys = np.sort(codes.astype(np.int64) * n + rows)
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+    codes, rows = keys // n, (keys % n).astype(np.int32)
+    cuts = np.flatnonzero(np.diff(codes)) + 1
+    return dict(zip(uniq[codes[np.r_[0, cuts]]], np.split(rows, cuts)))
+
+
+class SearchIndex:
+    """按目录版本构建一次，之后每次检索只做索引查找与集合求交"""
+
+    def __init__(self, df, cache_size=256, build=True):
+        text = df.astype(str)
+        # 逐列相加是向量化的字符串拼接，比 str.cat 快数倍
+        blob = text.iloc[:, 0]
+        for i in range(1, text.shape[1]):
+            blob = blob + "\n" + text.iloc[:, i]
+        blob = blob.str.lower().reset_index(drop=True)
+        self.size = len(blob)
+        self._blob = blob.to_numpy(dtype=object)
+        self.indexed = False
+
+        # 索引为所有会话共享，检索结果缓存的读写需加锁；检索本身在锁外进行
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        if build:
+            self.build()
+
+    def build(self):
+        """构建倒排表；可在后台线程中调用，期间的检索照常进行 (走整行扫描)"""
+        blob = pd.Series(self._blob)
+        words = _postings(blob.str.findall(_WORD_RE))
+        grams = _postings(blob.str.findall(_CJK_UNI_RE))
+        grams.update(_postings(blob.str.findall(_CJK_BI_RE)))
+
+        # 词表拼成一个长串，子串匹配交给 re 在 C 层完成
+        self._vocab = list(words)
+        self._vocab_blob = "\n".join(self._vocab)
+        self._vocab_starts = np.cumsum([0] + [len(t) + 1 for t in self._vocab[:-1]])
+        self._words, self._grams = words, grams
+        self.indexed = True
+
+    def _word_rows(self, term):
+        """词表中包含 term 的所有单词，其倒排表的并集"""
+        hits = self._words.get(term)
+        pos = [m.start() for m in re.finditer(re.escape(term), self._vocab_blob)]
+        if not pos:
+            return _EMPTY
+        ids = np.unique(np.searchsorted(self._vocab_starts, pos, side="right") - 1)
+        if len(ids) == 1 and hits is not None:
+            return hits
+        return np.unique(np.concatenate([self._words[self._vocab[i]] for i in ids]))
+
+    def _cjk_rows(self, run):
+        grams = [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+        return [self._grams.get(g, _EMPTY) for g in dict.fromkeys(grams)]
+
+    def _candidates(self, q):
+        lists = []
+        for term in dict.fromkeys(_WORD_RE.findall(q)):
+            lists.append(self._word_rows(term))
+            if not len(lists[-1]):
+                return _EMPTY
+        for run in dict.fromkeys(_CJK_RUN_RE.findall(q)):
+            lists.extend(self._cjk_rows(run))
+        if not lists:
+            return None
+        lists.sort(key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def search(self, query):
+        """返回命中行的位置 (升序 int32 数组)"""
+        q = query.lower()
+        with self._lock:
+            if q in self._cache:
+                self._cache.move_to_end(q)
+                return self._cache[q]
+
+        rows = self._candidates(q) if self.indexed else None
+        if rows is None:
+            # 倒排表尚未建好，或关键词只有空格或标点无法走索引：退回整列扫描
+            rows = np.arange(self.size, dtype=np.int32)
+        blob = self._blob
+        rows = np.asarray([r for r in rows if q in blob[r]], dtype=np.int32)
+
+        with self._lock:
+            self._cache[q] = rows
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return rows
@@ -0,0 +1,58 @@
+import numpy as np
+
+# ==========================================
+# 相似图书：特征矩阵 + 向量化近邻
+# ==========================================
+# 数值特征：标准化后的 ATOS、标准化后的 log(词数)；
+# 分类特征：Interest Level、类型、主题、系列。两个 one-hot 向量的平方距离只取决于取值是否相同，
+# 因此分类列只保存取值编号，按「编号是否相等」计距离，与 one-hot 展开等价但不占用 n×取值数 的内存。
+
+NUMERIC = {"ar": 1.0, "word": 0.5}                                # 列 -> 权重
+CATEGORICAL = {"il": 0.5, "fnf": 1.0, "topic": 0.75, "series": 1.5}  # 取值不同时的距离
+
+
+def _standardize(x):
+    x = x.astype(np.float32)
+    std = x.std()
+    return (x - x.mean()) / (std if std > 0 else 1.0)
+
+
+class SimilarBooks:
+    """每个目录版本构建一次；query() 只做几次整列向量运算和一次 argpartition"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        # 权重预先乘进特征 (取平方根)，距离直接是平方和；每列单独存放，运算都在连续内存上
+        self._num = [_standardize(df['ar'].to_numpy()) * np.float32(np.sqrt(NUMERIC["ar"])),
+                     _standardize(np.log1p(df['word'].to_numpy())) * np.float32(np.sqrt(NUMERIC["word"]))]
+        self._cats = []  # [(取值编号, 空值的编号, 权重)]
+        for k, w in CATEGORICAL.items():
+            cats = list(df[k].cat.categories)
+            # 取值为空 (如不属于任何系列) 的书，该列不参与比较
+            self._cats.append((df[k].cat.codes.to_numpy(), cats.index("") if "" in cats else -2, np.float32(w)))
+
+    def distances(self, row):
+        """第 row 行到每本书的距离 (float32)"""
+        d = np.zeros(self.size, dtype=np.float32)
+        for x in self._num:
+            d += np.square(x - x[row])
+        for codes, blank, w in self._cats:
+            if codes[row] != blank:
+                d += (codes != codes[row]) * w
+        return d
+
+    def query(self, row, k=6, within=None):
+        """与第 row 行最相近的 k 本书的行号 (由近到远)；within 为候选行号 (如当前筛选结果)"""
+        d = self.distances(row)
+        d[row] = np.inf
+        cand = None
+        if within is not None:
+            cand = np.asarray(within)
+            cand = cand[cand != row]
+            d = d[cand]
+        k = min(k, len(d) - (cand is None))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(d, k - 1)[:k]
+        top = top[np.argsort(d[top], kind="stable")]
+        return top if cand is None else cand[top]
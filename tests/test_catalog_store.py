@@ -0,0 +1,141 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import catalog_store
+from bench.synth import make_catalog
+from catalog_store import CatalogStore
+
+
+class Origin:
+    """模拟发布表格的源站：可改内容、状态码、响应延迟，可关闭 ETag；记录每次请求的条件头"""
+
+    def __init__(self, body=None, delay=0.0):
+        self.body = body if body is not None else make_catalog(200, seed=3).to_csv(index=False).encode()
+        self.status = 200
+        self.etag = True
+        self.delay = delay
+        self.requests = []
+
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                origin.requests.append(self.headers.get("If-None-Match"))
+                time.sleep(origin.delay)
+                tag = f'"v{hash(origin.body) & 0xffff}"'
+                if origin.status != 200:
+                    self.send_response(origin.status)
+                    self.end_headers()
+                    return
+                if origin.etag and self.headers.get("If-None-Match") == tag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if origin.etag:
+                    self.send_header("ETag", tag)
+                self.send_header("Content-Length", str(len(origin.body)))
+                self.end_headers()
+                self.wfile.write(origin.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/catalog.csv"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def origin():
+    o = Origin()
+    yield o
+    o.server.shutdown()
+    o.server.server_close()
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """记录 apply_schema 被调用的次数 (即表格被重新解析的次数)"""
+    calls = []
+    real = catalog_store.apply_schema
+
+    def counting(raw):
+        calls.append(len(raw))
+        return real(raw)
+
+    monkeypatch.setattr(catalog_store, "apply_schema", counting)
+    return calls
+
+
+def test_etag_turns_the_second_fetch_into_304(origin, parses, tmp_path):
+    store = CatalogStore(origin.url, tmp_path)
+    df, version = store.get()
+    assert len(df) == 200 and version
+    store.refresh()
+    assert origin.requests == [None, store._etag]
+    assert store.get() == (df, version)
+    assert len(parses) == 1 and store.error is None
+
+
+def test_unchanged_body_skips_the_parse(origin, parses, tmp_path):
+    origin.etag = False
+    store = CatalogStore(origin.url, tmp_path)
+    df, version = store.get()
+    store.refresh()
+    assert len(origin.requests) == 2
+    assert store.get()[0] is df
+    assert len(parses) == 1
+
+    origin.body = make_catalog(150, seed=4).to_csv(index=False).encode()
+    store.refresh()
+    df2, version2 = store.get()
+    assert len(df2) == 150 and version2 != version
+    assert len(parses) == 2
+
+
+def test_failed_refresh_keeps_the_current_catalog(origin, tmp_path):
+    store = CatalogStore(origin.url, tmp_path, ttl=0)
+    df, version = store.get()
+    origin.status = 500
+    store.refresh()
+    assert store.error is not None
+    assert store.get() == (df, version)
+    # 过期后 get() 只在后台重试，失败也不影响读取
+    time.sleep(0.01)
+    assert store.get() == (df, version)
+
+
+def test_cold_start_from_snapshot(origin, parses, tmp_path):
+    df, version = CatalogStore(origin.url, tmp_path).get()
+    origin.status, origin.delay = 500, 0.5
+    store = CatalogStore(origin.url, tmp_path)
+    t0 = time.monotonic()
+    cold, cold_version = store.get()
+    assert time.monotonic() - t0 < 0.3         # 有快照时冷启动不等网络
+    assert cold_version == version
+    assert cold.equals(df)
+    # 快照载入后尚未与源站确认过，get() 已在后台刷新；源站出错时继续用快照
+    deadline = time.monotonic() + 5
+    while store._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.error is not None and store.get() == (cold, version)
+    origin.delay = 0
+    # 快照中保存了 ETag，源站恢复后的刷新仍是条件请求
+    origin.status = 200
+    store.refresh()
+    assert origin.requests[-1] == store._etag and store.get()[1] == version
+    assert len(parses) == 1
+
+
+def test_cold_start_without_snapshot_raises_and_backs_off(origin, tmp_path):
+    origin.status = 500
+    store = CatalogStore(origin.url, tmp_path, retry=60)
+    with pytest.raises(Exception):
+        store.get()
+    with pytest.raises(Exception):
+        store.get()
+    assert len(origin.requests) == 1
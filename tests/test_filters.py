@@ -0,0 +1,108 @@
+import random
+
+import numpy as np
+import pytest
+
+from bench.synth import make_catalog
+from catalog import apply_schema, merge_catalogs
+from filters import ALL, FACETS, FilterCriteria, FilterEngine
+
+_FUZZY = ["moon", "Dragon", "story", "友谊", "的故事", "chen", "4.5", "series 1", "，"]
+_TITLE = ["moon", "RIVER", "the", "a", "star 1"]
+_AUTHOR = ["ann", "LEE", "o", "kim park"]
+_QUIZ = ["0", "1", "100", "1001", "99"]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    df, _ = apply_schema(make_catalog(3000, seed=11))
+    df = merge_catalogs([("A", df.iloc[:2000]), ("B", df.iloc[1500:])])
+    # ATOS 落在滑块刻度上的书 (float32 存储后略小于 3.3)
+    df.loc[:9, "ar"] = np.float32(3.3)
+    return df
+
+
+@pytest.fixture(scope="module")
+def engine(catalog):
+    e = FilterEngine(catalog)
+    e.start_index()
+    assert e.wait_index(30)
+    return e
+
+
+@pytest.fixture(scope="module")
+def cells(catalog):
+    """每行各单元格的小写文字 (图书 ID、来源名不参与模糊检索)"""
+    return [[v.lower() for v in row] for row in catalog.drop(columns=["id", "source"]).astype(str).to_numpy()]
+
+
+def _reference(df, cells, c):
+    """逐个条件过滤 DataFrame (原来的筛选链)，返回行号"""
+    f = df
+    if c.fuzzy:
+        q = c.fuzzy.lower()
+        f = f[np.array([any(q in v for v in row) for row in cells])]
+    if c.title: f = f[f["title"].str.lower().str.contains(c.title.lower(), regex=False)]
+    if c.author: f = f[f["author"].str.lower().str.contains(c.author.lower(), regex=False)]
+    for k in FACETS:
+        if getattr(c, k) != ALL: f = f[f[k].astype(str) == getattr(c, k)]
+    # 没有 Quiz 号 (记为 0) 的书不参与 Quiz 号检索
+    if c.quiz: f = f[(f["quiz"] > 0) & f["quiz"].astype(str).str.contains(c.quiz, regex=False)]
+    # 滑块的刻度为 0.1，按一位小数比较 ATOS
+    ar = f["ar"].astype(float).round(1)
+    f = f[(ar >= c.ar[0]) & (ar <= c.ar[1]) & (f["word"] >= c.word)]
+    return f.index.to_numpy()
+
+
+def _random_criteria(rng, df):
+    """每个条件约四分之一的概率被设置，其余保持默认"""
+    def some(options, default):
+        return rng.choice(options) if rng.random() < 0.25 else default
+
+    facets = {k: some([str(v) for v in df[k].cat.categories][:12] + ["不存在的取值"], ALL) for k in FACETS}
+    lo, hi = some([0.5, 2.0, 3.3, 4.5], 0.0), some([3.3, 6.0, 9.9], 12.0)
+    return FilterCriteria(
+        fuzzy=some(_FUZZY, ""), title=some(_TITLE, ""), author=some(_AUTHOR, ""),
+        word=some([1000, 20000], 0), quiz=some(_QUIZ, ""), ar=(min(lo, hi), max(lo, hi)), **facets,
+    )
+
+
+def _cases(catalog):
+    rng = random.Random(5)
+    return [_random_criteria(rng, catalog) for _ in range(300)]
+
+
+def test_select_matches_the_filter_chain(catalog, cells, engine):
+    for c in _cases(catalog):
+        np.testing.assert_array_equal(engine.select(c), _reference(catalog, cells, c), err_msg=str(c))
+
+
+def test_facet_counts_apply_only_the_other_filters(catalog, cells, engine):
+    for c in _cases(catalog)[:100]:
+        counts = engine.count_facets(c)
+        for k in FACETS:
+            rows = _reference(catalog, cells, c._replace(**{k: ALL}))
+            expected = catalog[k].iloc[rows].astype(str).value_counts().to_dict()
+            got = {v: n for v, n in counts[k].items() if n}
+            assert got == expected, (k, c)
+        assert counts == engine.facet_counts(c)
+
+
+def test_atos_bounds_include_books_on_the_tick(catalog, engine):
+    assert catalog["ar"].dtype == np.float32 and float(catalog["ar"].iat[0]) < 3.3
+    for bounds in ((3.3, 3.3), (0.0, 3.3), (3.3, 12.0)):
+        assert set(range(10)) <= set(engine.select(FilterCriteria(ar=bounds)))
+
+
+def test_books_without_quiz_never_match_a_quiz_search(catalog, engine):
+    missing = np.flatnonzero(catalog["quiz"].to_numpy() == 0)
+    assert len(missing)
+    assert not set(missing) & set(engine.select(FilterCriteria(quiz="0")))
+
+
+def test_select_results_are_memoized_and_read_only(engine):
+    c = FilterCriteria(title="moon", word=1000)
+    ids = engine.select(c)
+    assert engine.select(c) is ids
+    with pytest.raises(ValueError):
+        ids[0] = 0
@@ -0,0 +1,104 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench.synth import make_catalog
+from catalog import apply_schema, merge_catalogs
+from catalog_store import MultiCatalogStore
+from test_catalog_store import Origin
+
+
+def _raw(n, seed, quiz_from):
+    """合成表格，Quiz 号从 quiz_from 起 (无 Quiz 号的行保持为空)"""
+    raw = make_catalog(n, seed=seed)
+    has_quiz = raw["quiz"] != ""
+    raw.loc[has_quiz, "quiz"] = (raw.loc[has_quiz, "quiz"].astype(int) - 100000 + quiz_from).astype(str)
+    return raw
+
+
+@pytest.fixture
+def raws():
+    """来源 A、B：B 的前 30 行与 A 是同一批书 (推荐理由不同)，其余为 B 独有"""
+    a = _raw(100, 1, 100000)
+    b = pd.concat([a.iloc[:30], _raw(50, 2, 200000)], ignore_index=True)
+    b.loc[:29, "en"] = "another review"
+    # 无 Quiz 号的书按书名+作者 (不区分大小写) 认作同一本
+    a.loc[0, "quiz"], a.loc[0, "title"], a.loc[0, "author"] = "", "Quiet Book", "Ann Lee"
+    b.loc[0, "quiz"], b.loc[0, "title"], b.loc[0, "author"] = "", "QUIET BOOK", "ann lee"
+    return a, b
+
+
+def _keys(df):
+    return df["id"].str.replace(r"-\d+$", "", regex=True)
+
+
+def test_same_book_in_two_sources_is_kept_once(raws):
+    a, b = (apply_schema(r)[0] for r in raws)
+    out = merge_catalogs([("A", a), ("B", b)])
+    assert len(out) == len(a) + 50
+    assert out["id"].is_unique
+    # 重复的书保留最先收录它的来源 (A) 的行
+    shared = out.iloc[:30]
+    assert (shared["en"] != "another review").all()
+    assert (out["en"] == "another review").sum() == 0
+
+
+def test_source_labels_list_every_source_of_a_book(raws):
+    a, b = (apply_schema(r)[0] for r in raws)
+    out = merge_catalogs([("A", a), ("B", b)])
+    assert isinstance(out["source"].dtype, pd.CategoricalDtype)
+    labels = out["source"].astype(str)
+    assert (labels.iloc[:30] == "A, B").all()
+    assert (labels.iloc[30:100] == "A").all()
+    assert (labels.iloc[100:] == "B").all()
+
+
+def test_duplicates_within_one_source_are_kept(raws):
+    a, b = raws
+    # 同一来源内同一本书出现两次 (如两位推荐人各写一份)，B 中也有这本书
+    a = pd.concat([a, a.iloc[[5]]], ignore_index=True)
+    a_df, b_df = apply_schema(a)[0], apply_schema(b)[0]
+    out = merge_catalogs([("A", a_df), ("B", b_df)])
+    book = a_df["id"].iat[5]
+    assert (out["id"] == book).sum() == 1 and (out["id"] == book + "-2").sum() == 1
+    assert (_keys(out) == book).sum() == 2
+    assert set(out.loc[_keys(out) == book, "source"].astype(str)) == {"A, B"}
+    assert len(out) == len(a_df) + 50
+
+
+def test_single_source_matches_apply_schema(raws):
+    raw = pd.concat([raws[0], raws[0].iloc[[3, 7]]], ignore_index=True)
+    df, _ = apply_schema(raw)
+    out = merge_catalogs([("A", df)])
+    assert (out["source"].astype(str) == "A").all()
+    pd.testing.assert_frame_equal(out.drop(columns="source"), df)
+    assert out["id"].str.endswith("-2").sum() == 2
+
+
+def test_slow_source_does_not_block_the_first_get(raws, tmp_path):
+    a, b = raws
+    local = tmp_path / "a.csv"
+    a.to_csv(local, index=False)
+    slow = Origin(b.to_csv(index=False).encode(), delay=1.5)
+    try:
+        store = MultiCatalogStore([("A", str(local)), ("B", slow.url)], tmp_path / "snap", timeout=10)
+        t0 = time.monotonic()
+        df, version = store.get()
+        assert time.monotonic() - t0 < 1.0
+        assert len(df) == len(a) and (df["source"].astype(str) == "A").all()
+        assert isinstance(store.errors["B"], TimeoutError)
+
+        # 慢的来源拉取完成后，下一次 get() 并入
+        deadline = time.monotonic() + 10
+        while store.stores[1].df is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        df2, version2 = store.get()
+        assert version2 != version and store.errors == {}
+        assert len(df2) == len(a) + 50
+        assert set(df2["source"].astype(str)) == {"A", "B", "A, B"}
+        np.testing.assert_array_equal(df2["id"].iloc[:len(a)], df["id"])
+    finally:
+        slow.server.shutdown()
+        slow.server.server_close()
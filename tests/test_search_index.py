@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from bench.synth import make_catalog
+from catalog import apply_schema, merge_catalogs
+from filters import FilterCriteria, FilterEngine
+from search_index import SearchIndex
+
+QUERIES = [
+    # 英文：整词、词的一部分、跨词、大小写
+    "moon", "MOON", "oon", "river se", "story about", "teacher chen", "Series 1", "12.", "100012",
+    # 中文：单字、两字、长串
+    "的", "友谊", "友谊和成长的故事", "读起来停不下来", "好词好句", "没有这本",
+    # 中英混合
+    "哈利moon", "Potter第1", "harry 波特", "第1册", "dog 的", "moon故事",
+    # 只有空格或标点，走不了索引
+    " ", "，", "。", ".", "，适合", "!?", "“”", "-",
+]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    df = make_catalog(2000, seed=7)
+    # 合成数据的单元格不是纯英文就是纯中文，补几行中英混排的
+    df.iloc[0, 3] = "Harry Potter 哈利moon波特 第1册"
+    df.iloc[1, 10] = "A dog 的故事, with “quotes”!?"
+    df.iloc[2, 12] = "moon故事，适合-朗读"
+    return df
+
+
+def _scan(df, query):
+    """逐个单元格做子串匹配 (不区分大小写)"""
+    q = query.lower()
+    cells = df.astype(str).to_numpy()
+    return np.flatnonzero([any(q in c.lower() for c in row) for row in cells]).astype(np.int32)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches_substring_scan(catalog, query):
+    index = SearchIndex(catalog)
+    np.testing.assert_array_equal(index.search(query), _scan(catalog, query))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_before_build_matches_substring_scan(catalog, query):
+    index = SearchIndex(catalog, build=False)
+    np.testing.assert_array_equal(index.search(query), _scan(catalog, query))
+    assert not index.indexed
+
+
+# 数字列的文字形式：float32 的 ATOS、int32 的 Quiz 号与词数 (0 表示缺失)
+NUMERIC_QUERIES = ["4.5", "0.5", "0", "1000", "10001", "q1000", "12.0", "nan"]
+
+
+@pytest.fixture(scope="module")
+def app_frame(catalog):
+    """app 实际检索的目录：apply_schema 的结果经来源合并 (带 source 列)"""
+    df, _ = apply_schema(catalog)
+    return merge_catalogs([("A", df)])
+
+
+@pytest.fixture(scope="module")
+def app_engine(app_frame):
+    engine = FilterEngine(app_frame)
+    engine.start_index()
+    assert engine.wait_index(30)
+    return engine
+
+
+@pytest.mark.parametrize("query", QUERIES + NUMERIC_QUERIES)
+def test_engine_index_matches_scan_of_the_app_frame(app_frame, app_engine, query):
+    engine = app_engine
+    searched = app_frame.drop(columns=["id", "source"])
+    assert searched["ar"].dtype == np.float32 and searched["quiz"].dtype == np.int32
+    expected = _scan(searched, query)
+    np.testing.assert_array_equal(engine.search_index.search(query), expected)
+    np.testing.assert_array_equal(engine.select(FilterCriteria(fuzzy=query, ar=(0.0, 12.0))), expected)
+
+
+def test_cached_results_are_stable():
+    df = make_catalog(300, seed=1)
+    index = SearchIndex(df, cache_size=4)
+    first = [index.search(q).copy() for q in QUERIES]
+    # 缓存已淘汰多轮，再查一次结果不变
+    for q, rows in zip(QUERIES, first):
+        np.testing.assert_array_equal(index.search(q), rows)
+    assert len(index._cache) <= 4
+
+
+def test_concurrent_searches_share_one_cache():
+    df = make_catalog(500, seed=2)
+    index = SearchIndex(df, cache_size=8)
+    expected = {q: _scan(df, q) for q in QUERIES}
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda q: (q, index.search(q)), QUERIES * 20))
+    for q, rows in results:
+        np.testing.assert_array_equal(rows, expected[q])
+    assert len(index._cache) <= 8